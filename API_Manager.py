@@ -2,10 +2,59 @@ import logging
 import requests
 import time
 import hashlib
+from urllib.parse import quote_plus
 import constants
+from Trace_Manager import TraceRecorder, endpoint_for
+from Scheduler_Manager import RequestScheduler
+from Source_Manager import CodeDiscovery
+
+def _form_value(value):
+    # Same escaping requests applies to dict payloads, skipped for plain ids/codes
+    value = str(value)
+    if value.isascii() and value.isalnum():
+        return value
+    return quote_plus(value)
+
+class RequestBuilder:
+    # Builds signed form bodies for the two signed endpoints.
+    # The sign is md5("&".join(sorted k=v) + SALT); key orders are fixed, so the constant
+    # leading bytes are hashed once and the md5 state is copied for every request.
+    def __init__(self, salt):
+        self.salt = salt.encode("utf-8")
+        self._player_state = hashlib.md5(b"fid=")                 # fid, time
+        self._redeem_state = hashlib.md5(b"captcha_code=&cdk=")   # captcha_code, cdk, fid, time
+
+    def sign_player(self, fid, current_time):
+        h = self._player_state.copy()
+        h.update(f"{fid}&time={current_time}".encode("utf-8") + self.salt)
+        return h.hexdigest()
+
+    def sign_redeem(self, fid, cdk, current_time):
+        h = self._redeem_state.copy()
+        h.update(f"{cdk}&fid={fid}&time={current_time}".encode("utf-8") + self.salt)
+        return h.hexdigest()
+
+    def player_body(self, fid, current_time):
+        sign = self.sign_player(fid, current_time)
+        return "".join((
+            "fid=", _form_value(fid),
+            "&time=", current_time,
+            "&sign=", sign,
+        )).encode("ascii")
+
+    def redeem_body(self, fid, cdk, current_time):
+        sign = self.sign_redeem(fid, cdk, current_time)
+        return "".join((
+            "captcha_code=&cdk=", _form_value(cdk),
+            "&fid=", _form_value(fid),
+            "&time=", current_time,
+            "&sign=", sign,
+        )).encode("ascii")
 
 class KingshotAPI:
-    def __init__(self):
+    # transport: session-like object (post/get) used instead of the network, e.g. Trace_Manager.ReplayTransport
+    # recorder: Trace_Manager.TraceRecorder that logs every request/response (defaults to constants.TRACE_FILE)
+    def __init__(self, transport=None, recorder=None):
         self.logger = logging.getLogger("API")
         self.session = requests.Session()
         self.session.headers.update({
@@ -14,28 +63,60 @@ class KingshotAPI:
             "Referer": "https://ks-giftcode.centurygame.com/",
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
         })
-        self.request_delay = 5
+        self.scheduler = RequestScheduler(min_interval=5)  # request_delay: min seconds between any two requests
+        self.builder = RequestBuilder(constants.SALT)
+        self.transport = transport
+        trace_file = getattr(constants, "TRACE_FILE", None)
+        if recorder is None and trace_file:
+            recorder = TraceRecorder(trace_file)
+        self.recorder = recorder
+        self.discovery = CodeDiscovery(self._send)
 
-    def _generate_sign(self, params):
-        sorted_keys = sorted(params.keys())
-        raw_string = "&".join([f"{k}={params[k]}" for k in sorted_keys])
-        raw_string += constants.SALT
-        return hashlib.md5(raw_string.encode("utf-8")).hexdigest()
+    @property
+    def request_delay(self):
+        return self.scheduler.min_interval
+
+    @request_delay.setter
+    def request_delay(self, value):
+        self.scheduler.min_interval = value
+
+    def _send(self, url, payload=None, fid=None, cdk=None, timeout=10):
+        # POST when there is a payload, GET otherwise. Every request goes through here so it can be traced.
+        if self.transport is not None:
+            sender = self.transport
+        else:
+            sender = self.session if payload is not None else requests
+        started = time.perf_counter()
+        try:
+            if payload is not None:
+                response = sender.post(url, data=payload, timeout=timeout)
+            else:
+                response = sender.get(url, timeout=timeout)
+        except Exception as e:
+            if self.recorder:
+                self.recorder.record(endpoint_for(url), fid, cdk, started, time.perf_counter() - started, error=str(e), url=url)
+            raise
+        latency = time.perf_counter() - started
+        self.scheduler.record_latency(latency)
+        if self.recorder:
+            self.recorder.record(endpoint_for(url), fid, cdk, started, latency, response=response, url=url)
+        return response
 
     def get_player_info(self, fid):
         # This function also is "Login"  for redeeming
-        time.sleep(self.request_delay)
+        return self.fetch_player_info(fid)[0]
+
+    def fetch_player_info(self, fid):
+        # (player_data, found): found is False when the game says the id doesn't exist, None on transient errors
+        self.scheduler.wait()
 
         current_time = str(int(time.time() * 1000))
-        params = {
-            "fid": fid,
-            "time": current_time,
-        }
-        payload = params.copy()
-        payload['sign'] = self._generate_sign(params)
+        payload = self.builder.player_body(fid, current_time)
 
         try:
-            response = self.session.post(constants.PLAYER_URL, data=payload, timeout=10)
+            started = time.perf_counter()
+            response = self._send(constants.PLAYER_URL, payload, fid=fid)
+            latency_ms = round((time.perf_counter() - started) * 1000)
             response.raise_for_status()
             data = response.json()
 
@@ -53,72 +134,73 @@ class KingshotAPI:
                         rendered_level = "TG-?"
                 player_data['rendered_level'] = rendered_level
                 
-                self.logger.info(f"Player found: {player_data['nickname']} (LVL: {rendered_level})")
-                return player_data
+                self.logger.info(
+                    f"Player found: {player_data['nickname']} (LVL: {rendered_level})",
+                    extra={"fid": fid, "latency_ms": latency_ms, "sample": True}
+                )
+                return player_data, True
             
-            self.logger.warning(f"Player {fid} is NOT found: {data.get('msg')}")
-            return None
+            self.logger.warning(f"Player {fid} is NOT found: {data.get('msg')}", extra={"fid": fid, "latency_ms": latency_ms})
+            # Only "role not exist" is a definitive answer, anything else (timeouts, throttling) may succeed on retry
+            missing = data.get("err_code") == 40004 or "not exist" in str(data.get("msg", "")).lower()
+            return None, (False if missing else None)
         
         except requests.exceptions.HTTPError as e:
             if response.status_code == 429:
                 self.logger.error(f"RATE LIMITED (429) checking {fid}. We are going too fast!")
             else:
                 self.logger.error(f"HTTP Error looking up {fid}: {e}")
-            return None
+            return None, None
         except requests.exceptions.RequestException as e:
             self.logger.error(f"Network Error looking up {fid}: {e}")
-            return None
+            return None, None
         except ValueError:
             self.logger.error(f"Invalid JSON response for {fid}")
-            return None
+            return None, None
 
     def redeem_code(self, fid, cdk):
-        time.sleep(self.request_delay)
+        self.scheduler.wait()
         current_time = str(int(time.time() * 1000))
-        params = {
-            "captcha_code": "",
-            "cdk": cdk,
-            "fid": fid,
-            "time": current_time,
-        }
-        payload = params.copy()
-        payload['sign'] = self._generate_sign(params)
+        payload = self.builder.redeem_body(fid, cdk, current_time)
 
         try:
-            response = self.session.post(constants.REDEEM_URL, data=payload, timeout=10)
+            started = time.perf_counter()
+            response = self._send(constants.REDEEM_URL, payload, fid=fid, cdk=cdk)
             result = response.json()
+            fields = {"fid": fid, "code": cdk, "err_code": result.get("err_code"),
+                      "latency_ms": round((time.perf_counter() - started) * 1000)}
 
             if result.get("code") == 0 or result.get("err_code") == 20000:
-                 self.logger.info(f"Redemption SUCCESS for {fid} - Code: {cdk}")
+                 self.logger.info(f"Redemption SUCCESS for {fid} - Code: {cdk}", extra={**fields, "sample": True})
             elif result.get("err_code") == 40008:
-                self.logger.info(f"Redemption SKIPPED for {fid} - Code: {cdk} (Already Redeeemed)")
+                self.logger.info(f"Redemption SKIPPED for {fid} - Code: {cdk} (Already Redeeemed)", extra={**fields, "sample": True})
             elif result.get("err_code") == 40011:
-                self.logger.info(f"Redemption SKIPPED for {fid} - Code: {cdk} (Equivalent was already redeemed)") 
+                self.logger.info(f"Redemption SKIPPED for {fid} - Code: {cdk} (Equivalent was already redeemed)", extra={**fields, "sample": True}) 
             else:
-                self.logger.warning(f"Redemption FAILED for {fid} - Code: {cdk} | Msg: {result.get('msg')}")
+                self.logger.warning(f"Redemption FAILED for {fid} - Code: {cdk} | Msg: {result.get('msg')}", extra=fields)
 
             return result
         except Exception as e:
             self.logger.error(f"Redeem error for {fid}/{cdk}: {e}")
             return {"error": str(e)}
 
-    def get_active_codes(self):
-        time.sleep(self.request_delay)
+    def get_active_code_records(self):
+        # Merged entries of every code source: [{"code", "created_at", "expires_at", "raw", "sources"}], [] on failure
+        self.scheduler.wait()
         self.logger.info("Fetching active gift codes...")
         try:
-            response = requests.get(constants.ACTIVE_CODES_URL, timeout=10)
-            data = response.json()
-            if data.get("status") == "success":
-                codes = data['data']['giftCodes']
-                code_list = [item['code'] for item in codes]
-                self.logger.info(f"Found {len(code_list)} active codes: {', '.join(code_list)}")
-                return code_list
-            else:
-                self.logger.warning("Failed to fetch codes: API status was not 'success'")
-                return []
-        except requests.exceptions.RequestException as e:
-            self.logger.error(f"Network error fetching codes: {e}")
-            return []
+            records = self.discovery.discover()
         except Exception as e:
             self.logger.error(f"Unexpected error fetching codes: {e}")
-            return []
\ No newline at end of file
+            return []
+        if not records:
+            self.logger.warning("Failed to fetch codes: no code source answered")
+            return []
+        summary = ", ".join(
+            f"{r['code']} (expires {r['expires_at']})" if r['expires_at'] else r['code'] for r in records
+        )
+        self.logger.info(f"Found {len(records)} active codes: {summary}")
+        return records
+
+    def get_active_codes(self):
+        return [record['code'] for record in self.get_active_code_records()]
\ No newline at end of file
@@ -0,0 +1,52 @@
+import logging
+import constants
+
+class RedemptionArchiver:
+    # Keeps the hot redemptions table proportional to the codes that are still active.
+    # Codes that expired (or no feed reported for ARCHIVE_AFTER_DAYS) and saw no redemption for as long are moved to
+    # redemptions_archive + code_summaries, then the planner stats are refreshed and freed pages vacuumed.
+    def __init__(self, bot):
+        self.logger = logging.getLogger("DB")
+        self.bot = bot
+        self.min_age_days = getattr(constants, "ARCHIVE_AFTER_DAYS", 7)
+
+    def run(self, active_codes=None):
+        db = self.bot.db
+        if self.bot.cycle_active.is_set():
+            self.logger.info("Redemption cycle running. Waiting before maintenance...")
+            self.bot.cycle_idle.wait()
+
+        if active_codes is None:
+            active_codes, _ = self.bot.fetch_active_codes()
+
+        restored, archived, moved = [], [], 0
+        if active_codes:
+            # A cycle or /redeem_for holds PlayerRecords and bit ids of the current index: wait until none runs,
+            # and keep new ones from starting, for the whole archive + reload
+            with db.index_gate.exclusive():
+                restored = db.restore_archived_codes(active_codes)  # Updates the index in place
+                archived = db.get_archive_candidates(active_codes, self.min_age_days)
+                moved = db.archive_codes(archived)
+                if moved:
+                    db.load_index()  # Drops the archived codes' bits
+        else:
+            # An empty list is also what a failed fetch returns: never archive on it
+            self.logger.warning("No active code list available, skipping archival.")
+
+        free_pages = db.optimize(analyze=bool(restored or moved))
+
+        storage = db.get_storage_stats()
+        report = {
+            "archived_codes": len(archived),
+            "archived_rows": moved,
+            "restored_codes": len(restored),
+            "freed_pages": free_pages,
+            "hot_rows": storage['hot_rows'],
+            "cold_rows": storage['archived_rows'],
+        }
+        self.logger.info(
+            f"Maintenance finished: {report['archived_codes']} codes / {moved} rows archived, "
+            f"{report['restored_codes']} restored, {free_pages} pages freed. "
+            f"Hot rows: {report['hot_rows']} | Archived rows: {report['cold_rows']}"
+        )
+        return report
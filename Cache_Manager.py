@@ -0,0 +1,104 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+class _Flight:
+    # One in-progress lookup that concurrent callers for the same fid wait on
+    __slots__ = ("done", "result")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+class ProfileCache:
+    # Bounded LRU of player profiles in front of the player endpoint.
+    # loader(fid) -> (profile, found): found True/False is a definitive answer, None a transient failure.
+    # Found profiles live `ttl` seconds, "role not exist" answers `negative_ttl` seconds, failures are never cached.
+    # Concurrent lookups of the same fid share one request (single flight).
+    def __init__(self, loader, maxsize=2048, ttl=300, negative_ttl=60):
+        self.logger = logging.getLogger("API")
+        self.loader = loader
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.entries = OrderedDict()  # {fid: (expires_at, profile or None)}
+        self.flights = {}             # {fid: _Flight}
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "negative_hits": 0, "misses": 0, "coalesced": 0, "evictions": 0}
+
+    @staticmethod
+    def _key(fid):
+        try:
+            return int(fid)
+        except (TypeError, ValueError):
+            return fid
+
+    def get(self, fid):
+        key = self._key(fid)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self.entries.move_to_end(key)
+                    self.counters["hits" if entry[1] is not None else "negative_hits"] += 1
+                    return entry[1]
+                del self.entries[key]
+            flight = self.flights.get(key)
+            if flight is not None:
+                self.counters["coalesced"] += 1
+                leader = False
+            else:
+                flight = self.flights[key] = _Flight()
+                self.counters["misses"] += 1
+                leader = True
+
+        if not leader:
+            flight.done.wait()
+            return flight.result
+
+        profile, found = None, None
+        try:
+            profile, found = self.loader(fid)
+        finally:
+            with self.lock:
+                if found is not None:
+                    self._store(key, profile if found else None)
+                flight.result = profile
+                del self.flights[key]
+            flight.done.set()
+        return profile
+
+    def is_known_missing(self, fid):
+        # True while a fresh "role not exist" answer is cached for fid (counts as a negative hit)
+        key = self._key(fid)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] is None and entry[0] > time.monotonic():
+                self.counters["negative_hits"] += 1
+                return True
+            return False
+
+    def put(self, fid, profile):
+        # Profiles fetched elsewhere (cycle logins, refresh sweep) keep the cache warm
+        with self.lock:
+            self._store(self._key(fid), profile)
+
+    def invalidate(self, fid):
+        with self.lock:
+            self.entries.pop(self._key(fid), None)
+
+    def _store(self, key, profile):
+        ttl = self.ttl if profile is not None else self.negative_ttl
+        self.entries[key] = (time.monotonic() + ttl, profile)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters, size=len(self.entries), maxsize=self.maxsize)
+        lookups = stats["hits"] + stats["negative_hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_rate"] = (stats["hits"] + stats["negative_hits"] + stats["coalesced"]) / lookups if lookups else None
+        return stats
@@ -0,0 +1,49 @@
+from datetime import datetime, timezone
+
+# Field names the gift-code feed has used for code metadata, first match wins
+EXPIRY_KEYS = ("expiresAt", "expires_at", "expireAt", "expiry", "expiryDate", "validUntil", "endDate")
+CREATED_KEYS = ("createdAt", "created_at", "startDate", "publishedAt")
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"  # UTC, same text format as SQLite CURRENT_TIMESTAMP
+
+def parse_feed_time(value):
+    # ISO strings ("2026-03-01T12:00:00.000Z", "+00:00" offsets, plain dates) or unix seconds/milliseconds
+    if value in (None, ""):
+        return None
+    try:
+        if isinstance(value, (int, float)) or str(value).isdigit():
+            seconds = float(value)
+            if seconds > 1e11:
+                seconds /= 1000
+            moment = datetime.fromtimestamp(seconds, timezone.utc)
+        else:
+            moment = datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+            if moment.tzinfo is None:
+                moment = moment.replace(tzinfo=timezone.utc)
+        return moment.astimezone(timezone.utc).strftime(TS_FORMAT)
+    except (ValueError, OverflowError, OSError):
+        return None
+
+def _first(item, keys):
+    for key in keys:
+        if item.get(key) not in (None, ""):
+            return item[key]
+    return None
+
+def normalize_record(item):
+    # {"code", "created_at", "expires_at", "raw"} from one giftCodes entry
+    return {
+        "code": str(item['code']).strip(),
+        "created_at": parse_feed_time(_first(item, CREATED_KEYS)),
+        "expires_at": parse_feed_time(_first(item, EXPIRY_KEYS)),
+        "raw": item,
+    }
+
+def deadline_order(codes, deadlines):
+    # Earliest expiry first, codes without a known expiry keep their feed order at the end
+    position = {code: i for i, code in enumerate(codes)}
+    return sorted(codes, key=lambda code: (deadlines.get(code) is None, deadlines.get(code) or "", position[code]))
+
+def urgent_codes(codes, deadlines, horizon_end):
+    # Codes that expire before horizon_end (a UTC datetime), e.g. the estimated end of the cycle
+    cutoff = horizon_end.astimezone(timezone.utc).strftime(TS_FORMAT)
+    return [code for code in codes if deadlines.get(code) and deadlines[code] <= cutoff]
@@ -1,15 +1,78 @@
+import json
 import logging
+import functools
 import sqlite3
+import threading
 import constants
+from Index_Manager import PlayerIndex, IndexGate
+
+# Connection pragmas per storage profile (DB_PROFILE), single values can be overridden with DB_PRAGMAS.
+# "default" keeps SQLite's own settings: rollback journal, synchronous=FULL, 2 MiB cache, no mmap.
+# WAL + synchronous=NORMAL never corrupts the file; a power cut can lose the last commits, which the
+# next cycle simply redeems again (40008 "already claimed" is logged as redeemed).
+STORAGE_PROFILES = {
+    "default": {},  # SQLite's own settings, maintenance never rewrites the file
+    "durable": {
+        "journal_mode": "WAL", "synchronous": "FULL", "cache_size": -16384,
+        "mmap_size": 64 * 1024 * 1024, "temp_store": "MEMORY", "page_size": 4096, "auto_vacuum": "INCREMENTAL",
+    },
+    "balanced": {
+        "journal_mode": "WAL", "synchronous": "NORMAL", "cache_size": -32768,
+        "mmap_size": 256 * 1024 * 1024, "temp_store": "MEMORY", "page_size": 4096, "auto_vacuum": "INCREMENTAL",
+    },
+    "fast": {  # Benchmarks only: synchronous=OFF can corrupt the file on power loss
+        "journal_mode": "WAL", "synchronous": "OFF", "cache_size": -65536,
+        "mmap_size": 1024 * 1024 * 1024, "temp_store": "MEMORY", "page_size": 8192, "auto_vacuum": "INCREMENTAL",
+    },
+}
+PRAGMA_ORDER = ("page_size", "auto_vacuum", "journal_mode", "synchronous", "cache_size", "mmap_size", "temp_store")  # File layout before WAL
+
+def locked(method):
+    # All threads share one connection and therefore one transaction: a method's statements and its
+    # commit (or `with self.conn:` block) run under the manager's lock, so no other thread can commit
+    # or roll back halfway through them
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
 
 class DatabaseManager:
     def __init__(self):
         self.logger = logging.getLogger("DB")
         self.conn = sqlite3.connect(constants.DB_NAME, check_same_thread=False)
         self.conn.row_factory = sqlite3.Row 
-        self.cursor = self.conn.cursor()
+        self.local = threading.local()  # One cursor per thread: the cycle, /redeem_for and the event loop run concurrently
+        self.lock = threading.RLock()    # Serializes statements + commit across those threads (see locked)
+        self.index = None  # PlayerIndex, built by load_index()
+        self.index_gate = IndexGate()  # Shared while records are in use, exclusive to swap the index
+        self.pragmas = self._apply_storage_profile()
         self._create_tables()
 
+    @property
+    def cursor(self):
+        cursor = getattr(self.local, "cursor", None)
+        if cursor is None:
+            cursor = self.local.cursor = self.conn.cursor()
+        return cursor
+
+    def _apply_storage_profile(self):
+        # page_size only takes effect on a new database here, existing files are converted by optimize()
+        name = getattr(constants, "DB_PROFILE", "balanced")
+        if name not in STORAGE_PROFILES:
+            self.logger.warning(f"Unknown DB_PROFILE '{name}', using SQLite defaults.")
+        # auto_vacuum (tuned profiles), like page_size, only takes effect on a new, empty database (older ones are converted by
+        # the first maintenance run) and has to be set before switching to WAL writes the file header
+        pragmas = dict(STORAGE_PROFILES.get(name, {}), **getattr(constants, "DB_PRAGMAS", {}))
+        for key in PRAGMA_ORDER:
+            if key not in pragmas:
+                continue
+            row = self.conn.execute(f"PRAGMA {key} = {pragmas[key]}").fetchone()
+            if key == "journal_mode" and row[0].lower() != str(pragmas[key]).lower():
+                # e.g. WAL on a filesystem without shared memory support
+                self.logger.warning(f"journal_mode {pragmas[key]} not available, using {row[0]}.")
+        return pragmas
+
     def _create_tables(self):
         try:
             self.cursor.execute('''
@@ -30,6 +93,79 @@ class DatabaseManager:
                     FOREIGN KEY (fid) REFERENCES players (fid)
                 )
             ''')
+            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_redemptions_code ON redemptions (code, redeemed_at)")
+            # Cold storage for codes that expired: one row per player per code, plus one summary row per code
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS redemptions_archive (
+                    fid INTEGER,
+                    code TEXT,
+                    redeemed_at TIMESTAMP,
+                    PRIMARY KEY (fid, code)
+                ) WITHOUT ROWID
+            ''')
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS code_summaries (
+                    code TEXT PRIMARY KEY,
+                    redemptions INTEGER,
+                    first_redeemed_at TIMESTAMP,
+                    last_redeemed_at TIMESTAMP,
+                    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            self._add_column_if_missing("players", "profile_updated_at", "TIMESTAMP")
+            self._add_column_if_missing("players", "tier", "TEXT DEFAULT 'normal'")
+            self._add_column_if_missing("players", "fail_streak", "INTEGER DEFAULT 0")
+            self._add_column_if_missing("players", "idle_streak", "INTEGER DEFAULT 0")
+            self._add_column_if_missing("players", "last_attempt_at", "TIMESTAMP")
+            self._add_column_if_missing("players", "last_success_at", "TIMESTAMP")
+            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_players_kid ON players (kid)")
+            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_players_profile_updated ON players (profile_updated_at)")
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS code_equivalents (
+                    code TEXT PRIMARY KEY,
+                    group_id TEXT NOT NULL,
+                    learned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS gift_codes (
+                    code TEXT PRIMARY KEY,
+                    created_at TIMESTAMP,
+                    expires_at TIMESTAMP,
+                    first_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    raw TEXT
+                )
+            ''')
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS cycle_stats (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    finished_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    duration_s REAL,
+                    total_players INTEGER,
+                    redeemed INTEGER,
+                    skipped_full INTEGER,
+                    skipped_error INTEGER,
+                    skipped_kingdom INTEGER,
+                    skipped_tier INTEGER,
+                    skipped_equivalent INTEGER,
+                    failed_players TEXT
+                )
+            ''')
+            # Roster links: which Discord guild(s) added a player. (guild_id, fid) serves per-guild queries.
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS player_guilds (
+                    guild_id INTEGER,
+                    fid INTEGER,
+                    added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (guild_id, fid)
+                ) WITHOUT ROWID
+            ''')
+            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_player_guilds_fid ON player_guilds (fid)")
+            self._add_column_if_missing("cycle_stats", "requests", "INTEGER")
+            self._add_column_if_missing("gift_codes", "sources", "TEXT")         # Code sources that listed it, by priority
+            self._add_column_if_missing("gift_codes", "status", "TEXT")          # NULL (unvalidated) | valid | invalid
+            self._add_column_if_missing("gift_codes", "validated_at", "TIMESTAMP")
             self.cursor.execute('''
                 CREATE TABLE IF NOT EXISTS guild_settings (
                     guild_id INTEGER PRIMARY KEY,
@@ -41,6 +177,14 @@ class DatabaseManager:
         except sqlite3.Error as e:
             self.logger.error(f"Database initialization error: {e}")
 
+    def _add_column_if_missing(self, table, column, definition):
+        # Lightweight migration for databases created before the column existed
+        self.cursor.execute(f"PRAGMA table_info({table})")
+        if column not in [row['name'] for row in self.cursor.fetchall()]:
+            self.cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            self.logger.info(f"Migrated table {table}: added column {column}.")
+
+    @locked
     def _set_guild_channel(self, guild_id, channel_id):
         try:
             self.cursor.execute(
@@ -51,6 +195,7 @@ class DatabaseManager:
         except Exception as e:
             self.logger.error(f"Error setting guild channel: {e}")
 
+    @locked
     def _delete_guild_channel(self, guild_id):
         try:
             self.cursor.execute("DELETE FROM guild_settings WHERE guild_id = ?", (guild_id,))
@@ -60,28 +205,38 @@ class DatabaseManager:
             self.logger.error(f"Error deleting guild channel: {e}")
             return False
 
-    def _save_player_to_db(self, data):
+    @locked
+    def _save_player_to_db(self, data, guild_id=None):
         try:
             self.cursor.execute(
                 "INSERT OR IGNORE INTO players (fid, nickname, kid) VALUES (?, ?, ?)", 
                 (data['fid'], data['nickname'], data['kid'])
             )
+            inserted = self.cursor.rowcount > 0
+            if guild_id is not None:
+                self.cursor.execute("INSERT OR IGNORE INTO player_guilds (guild_id, fid) VALUES (?, ?)", (guild_id, data['fid']))
             self.conn.commit()
 
-            if self.cursor.rowcount > 0:
+            if inserted:
                 self.logger.info(f"New player saved: {data['nickname']}")
+                if self.index is not None:
+                    self.index.add_player(data['fid'], data['nickname'], data['kid'], self.check_codes_redeemed(data['fid']))
             else:
                 self.logger.info(f"Player already exists: {data['nickname']} (Skipped)")
 
         except Exception as e:
             self.logger.error(f"Database error saving player: {e}")
 
+    @locked
     def _delete_player(self, fid):
         try:
+            self.cursor.execute('DELETE FROM player_guilds WHERE fid = ?', (fid,))
             self.cursor.execute('DELETE FROM players WHERE fid = ?', (fid,))
             self.conn.commit()
             if self.cursor.rowcount > 0:
                 self.logger.info(f"Deleted player with ID {fid}.")
+                if self.index is not None:
+                    self.index.remove_player(fid)
                 return True
             else:
                 self.logger.warning(f"No player found with ID {fid} to delete.")
@@ -90,18 +245,318 @@ class DatabaseManager:
             self.logger.error(f"Database error deleting player: {e}")
             return False
 
+    @locked
+    def link_player_to_guild(self, fid, guild_id):
+        try:
+            self.cursor.execute("INSERT OR IGNORE INTO player_guilds (guild_id, fid) VALUES (?, ?)", (guild_id, fid))
+            self.conn.commit()
+            return self.cursor.rowcount > 0
+        except Exception as e:
+            self.logger.error(f"Database error linking player {fid} to guild {guild_id}: {e}")
+            return False
+
+    @locked
+    def unlink_player_from_guild(self, fid, guild_id):
+        # Returns the number of guilds still linked to the player, None on error
+        try:
+            self.cursor.execute("DELETE FROM player_guilds WHERE guild_id = ? AND fid = ?", (guild_id, fid))
+            self.conn.commit()
+            self.cursor.execute("SELECT COUNT(*) AS count FROM player_guilds WHERE fid = ?", (fid,))
+            return self.cursor.fetchone()['count']
+        except Exception as e:
+            self.logger.error(f"Database error unlinking player {fid} from guild {guild_id}: {e}")
+            return None
+
+    @locked
+    def get_player_guilds(self, fid):
+        self.cursor.execute("SELECT guild_id FROM player_guilds WHERE fid = ? ORDER BY added_at", (fid,))
+        return [row['guild_id'] for row in self.cursor.fetchall()]
+
+    @locked
+    def get_guild_memberships(self):
+        # {fid: [guild_id, ...]} ordered by link date, the first one is the player's home guild for fair-share scheduling
+        cursor = self.conn.cursor()
+        cursor.row_factory = None
+        memberships = {}
+        try:
+            for fid, guild_id in cursor.execute("SELECT fid, guild_id FROM player_guilds ORDER BY added_at, guild_id"):
+                memberships.setdefault(fid, []).append(guild_id)
+        finally:
+            cursor.close()
+        return memberships
+
+    @locked
     def _update_player_info(self, fid, new_nickname, new_kid):
         try:
             self.cursor.execute(
-                "UPDATE players SET nickname = ?, kid = ? WHERE fid = ?", 
+                "UPDATE players SET nickname = ?, kid = ?, profile_updated_at = CURRENT_TIMESTAMP WHERE fid = ?", 
                 (new_nickname, new_kid, fid)
             )
             self.conn.commit()
             if self.cursor.rowcount > 0:
                 self.logger.info(f"Updated player info for ID {fid}")
+                if self.index is not None:
+                    self.index.update_player(fid, new_nickname, new_kid)
         except Exception as e:
             self.logger.error(f"Database error updating player info for {fid}: {e}")
 
+    @locked
+    def bulk_update_player_info(self, profiles):
+        # profiles: [(fid, nickname, kid)]. One transaction, also marks the profiles as refreshed.
+        if not profiles:
+            return 0
+        try:
+            self.conn.executemany(
+                "UPDATE players SET nickname = ?, kid = ?, profile_updated_at = CURRENT_TIMESTAMP WHERE fid = ?",
+                [(nickname, kid, fid) for fid, nickname, kid in profiles]
+            )
+            self.conn.commit()
+            if self.index is not None:
+                for fid, nickname, kid in profiles:
+                    self.index.update_player(fid, nickname, kid)
+            self.logger.info(f"Refreshed {len(profiles)} player profiles.")
+            return len(profiles)
+        except Exception as e:
+            self.logger.error(f"Database error in bulk profile update: {e}")
+            return 0
+
+    @locked
+    def touch_profiles(self, fids):
+        # Marks profiles as refreshed without changing nickname/kid (failed lookups in the refresh sweep)
+        if not fids:
+            return 0
+        try:
+            self.conn.executemany(
+                "UPDATE players SET profile_updated_at = CURRENT_TIMESTAMP WHERE fid = ?",
+                [(fid,) for fid in fids]
+            )
+            self.conn.commit()
+            return len(fids)
+        except Exception as e:
+            self.logger.error(f"Database error marking profiles as refreshed: {e}")
+            return 0
+
+    @locked
+    def get_player_schedule(self):
+        # {fid: row(tier, fail_streak, idle_streak, days_since_attempt)} for the cycle planner
+        self.cursor.execute('''
+            SELECT fid, tier, fail_streak, idle_streak,
+                   julianday('now') - julianday(last_attempt_at) AS days_since_attempt
+            FROM players
+        ''')
+        return {row['fid']: row for row in self.cursor.fetchall()}
+
+    @locked
+    def bulk_update_player_tiers(self, updates):
+        # updates: [(fid, tier, fail_streak, idle_streak, claimed)]
+        if not updates:
+            return
+        try:
+            self.conn.executemany(
+                '''UPDATE players SET tier = ?, fail_streak = ?, idle_streak = ?,
+                       last_attempt_at = CURRENT_TIMESTAMP,
+                       last_success_at = CASE WHEN ? THEN CURRENT_TIMESTAMP ELSE last_success_at END
+                   WHERE fid = ?''',
+                [(tier, fail_streak, idle_streak, claimed, fid) for fid, tier, fail_streak, idle_streak, claimed in updates]
+            )
+            self.conn.commit()
+        except Exception as e:
+            self.logger.error(f"Database error updating player tiers: {e}")
+
+    @locked
+    def log_cycle_stats(self, stats):
+        try:
+            redeemed = sum(count * players for count, players in stats['distribution'].items())
+            self.cursor.execute(
+                '''INSERT INTO cycle_stats (duration_s, total_players, redeemed, skipped_full, skipped_error,
+                                            skipped_kingdom, skipped_tier, skipped_equivalent, failed_players, requests)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                (stats.get('duration_s'), stats['total_players'], redeemed, stats['skipped_full'], stats['skipped_error'],
+                 stats.get('skipped_kingdom', 0), stats.get('skipped_tier', 0), stats.get('skipped_equivalent', 0),
+                 ", ".join(stats['failed_players']), stats.get('requests'))
+            )
+            self.conn.commit()
+        except Exception as e:
+            self.logger.error(f"Database error logging cycle stats: {e}")
+
+    @locked
+    def get_cycle_pace(self, limit):
+        # Observed seconds per API request of the last `limit` cycles that made requests
+        self.cursor.execute(
+            "SELECT duration_s / requests AS pace FROM cycle_stats WHERE requests > 0 AND duration_s > 0 ORDER BY id DESC LIMIT ?",
+            (limit,)
+        )
+        return [row['pace'] for row in self.cursor.fetchall()]
+
+    def stream_rows(self, query, params=(), chunk_size=1000):
+        # Streams a query on its own cursor in fetchmany() chunks (SQLite steps the statement lazily),
+        # so exports run in constant memory and don't disturb the shared per-thread cursor.
+        cursor = self.conn.cursor()
+        try:
+            with self.lock:
+                cursor.execute(query, params)
+            yield [column[0] for column in cursor.description]
+            while True:
+                with self.lock:  # Per chunk, never across a yield
+                    rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield from (tuple(row) for row in rows)
+        finally:
+            cursor.close()
+
+    def stream_players(self, since=None):
+        query = "SELECT fid, nickname, kid, tier, added_date, profile_updated_at, last_attempt_at, last_success_at FROM players"
+        if since:
+            return self.stream_rows(
+                query + " WHERE added_date >= ? OR profile_updated_at >= ? OR last_attempt_at >= ? ORDER BY fid",
+                (since, since, since)
+            )
+        return self.stream_rows(query + " ORDER BY fid")
+
+    def stream_redemptions(self, since=None):
+        # Archived (expired) codes first, then the hot table in insertion order. Two sequential scans in
+        # storage order: a global ORDER BY over both tables would sort the whole history in temp_store.
+        where, params = (" WHERE redeemed_at >= ?", (since,)) if since else ("", ())
+        archive = self.stream_rows("SELECT fid, code, redeemed_at FROM redemptions_archive" + where + " ORDER BY fid, code", params)
+        yield next(archive)
+        yield from archive
+        hot = self.stream_rows("SELECT fid, code, redeemed_at FROM redemptions" + where + " ORDER BY id", params)
+        next(hot)  # Same columns, header already sent
+        yield from hot
+
+    def stream_cycle_stats(self, since=None):
+        query = "SELECT * FROM cycle_stats"
+        if since:
+            return self.stream_rows(query + " WHERE finished_at >= ? ORDER BY id", (since,))
+        return self.stream_rows(query + " ORDER BY id")
+
+    @locked
+    def save_gift_codes(self, records):
+        # records: normalized feed entries (Code_Manager.normalize_record). Known metadata is kept
+        # when a later feed omits it, so a code's deadline survives flaky or partial responses.
+        if not records:
+            return
+        try:
+            self.conn.executemany('''
+                INSERT INTO gift_codes (code, created_at, expires_at, raw, sources) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (code) DO UPDATE SET
+                    created_at = COALESCE(excluded.created_at, created_at),
+                    expires_at = COALESCE(excluded.expires_at, expires_at),
+                    last_seen_at = CURRENT_TIMESTAMP,
+                    raw = excluded.raw,
+                    sources = COALESCE(excluded.sources, sources)
+            ''', [(r['code'], r['created_at'], r['expires_at'], json.dumps(r['raw'], ensure_ascii=False),
+                   ", ".join(r.get('sources', ())) or None) for r in records])
+            self.conn.commit()
+        except Exception as e:
+            self.logger.error(f"Database error saving gift codes: {e}")
+
+    @locked
+    def get_code_deadlines(self, codes):
+        # {code: expires_at} for the given codes, None when the feed never gave an expiry
+        if not codes:
+            return {}
+        placeholders = ", ".join("?" * len(codes))
+        self.cursor.execute(f"SELECT code, expires_at FROM gift_codes WHERE code IN ({placeholders})", list(codes))
+        deadlines = {code: None for code in codes}
+        deadlines.update({row['code']: row['expires_at'] for row in self.cursor.fetchall()})
+        return deadlines
+
+    @locked
+    def get_code_statuses(self, codes):
+        # {code: "valid" | "invalid" | None}. A code someone already redeemed counts as valid without a canary.
+        if not codes:
+            return {}
+        placeholders = ", ".join("?" * len(codes))
+        self.cursor.execute(f'''
+            SELECT g.code,
+                   COALESCE(g.status, CASE WHEN EXISTS (SELECT 1 FROM redemptions r WHERE r.code = g.code) THEN 'valid' END) AS status
+            FROM gift_codes g WHERE g.code IN ({placeholders})
+        ''', list(codes))
+        statuses = {code: None for code in codes}
+        statuses.update({row['code']: row['status'] for row in self.cursor.fetchall()})
+        return statuses
+
+    @locked
+    def set_code_status(self, code, status):
+        try:
+            self.cursor.execute(
+                "UPDATE gift_codes SET status = ?, validated_at = CURRENT_TIMESTAMP WHERE code = ?", (status, code)
+            )
+            self.conn.commit()
+        except Exception as e:
+            self.logger.error(f"Database error saving status of code {code}: {e}")
+
+    @locked
+    def get_canary_player(self, codes):
+        # Player missing the most of `codes`, then hot and most recently successful first
+        placeholders = ", ".join("?" * len(codes))
+        self.cursor.execute(f'''
+            SELECT fid FROM players p
+            ORDER BY (SELECT COUNT(*) FROM redemptions r WHERE r.fid = p.fid AND r.code IN ({placeholders})),
+                     COALESCE(p.tier, 'normal') = 'hot' DESC, p.last_success_at DESC
+            LIMIT 1
+        ''', list(codes))
+        row = self.cursor.fetchone()
+        return row['fid'] if row else None
+
+    @locked
+    def get_code_groups(self):
+        self.cursor.execute("SELECT code, group_id FROM code_equivalents")
+        return {row['code']: row['group_id'] for row in self.cursor.fetchall()}
+
+    @locked
+    def save_code_group(self, group_id, codes):
+        try:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO code_equivalents (code, group_id) VALUES (?, ?)",
+                [(code, group_id) for code in codes]
+            )
+            self.conn.commit()
+        except Exception as e:
+            self.logger.error(f"Database error saving code group {group_id}: {e}")
+
+    @locked
+    def expire_code_equivalents(self, max_age_hours):
+        # Removes whole groups that hold a link older than max_age_hours, returns the removed codes
+        try:
+            self.cursor.execute('''
+                SELECT code FROM code_equivalents WHERE group_id IN (
+                    SELECT group_id FROM code_equivalents WHERE learned_at < datetime('now', ?)
+                )
+            ''', (f"-{max_age_hours} hours",))
+            codes = [row['code'] for row in self.cursor.fetchall()]
+            if codes:
+                self.conn.executemany("DELETE FROM code_equivalents WHERE code = ?", [(code,) for code in codes])
+                self.conn.commit()
+            return codes
+        except Exception as e:
+            self.logger.error(f"Database error expiring code equivalents: {e}")
+            return []
+
+    @locked
+    def delete_code_equivalents(self, codes):
+        try:
+            self.conn.executemany("DELETE FROM code_equivalents WHERE code = ?", [(code,) for code in codes])
+            self.conn.commit()
+        except Exception as e:
+            self.logger.error(f"Database error deleting code equivalents: {e}")
+
+    @locked
+    def get_tier_counts(self):
+        self.cursor.execute("SELECT COALESCE(tier, 'normal') as tier, COUNT(*) as count FROM players GROUP BY 1")
+        return {row['tier']: row['count'] for row in self.cursor.fetchall()}
+
+    @locked
+    def get_stale_profiles(self, limit):
+        # Never refreshed (NULL) first, then least recently refreshed
+        self.cursor.execute(
+            "SELECT fid, nickname, kid FROM players ORDER BY profile_updated_at ASC LIMIT ?", (limit,)
+        )
+        return self.cursor.fetchall()
+
+    @locked
     def get_all_registrations(self):
         try:
             self.cursor.execute("SELECT guild_id, target_channel_id FROM guild_settings")
@@ -110,6 +565,7 @@ class DatabaseManager:
             self.logger.error(f"Error fetching all registrations: {e}")
             return []
 
+    @locked
     def get_all_target_channels(self):
         try:
             self.cursor.execute("SELECT target_channel_id FROM guild_settings")
@@ -118,22 +574,67 @@ class DatabaseManager:
             self.logger.error(f"Error fetching target channels: {e}")
             return []
 
+    @locked
     def is_guild_registered(self, guild_id):
         self.cursor.execute("SELECT 1 FROM guild_settings WHERE guild_id = ?", (guild_id,))
         return self.cursor.fetchone() is not None
 
+    @locked
+    def get_guild_players(self, guild_id):
+        self.cursor.execute('''
+            SELECT p.fid, p.nickname, p.kid FROM player_guilds g
+            JOIN players p ON p.fid = g.fid
+            WHERE g.guild_id = ? ORDER BY g.added_at
+        ''', (guild_id,))
+        return self.cursor.fetchall()
+
+    @locked
+    def is_player_in_guild(self, fid, guild_id):
+        self.cursor.execute("SELECT 1 FROM player_guilds WHERE guild_id = ? AND fid = ?", (guild_id, fid))
+        return self.cursor.fetchone() is not None
+
+    @locked
+    def get_guild_stats(self, guild_id):
+        # Roster size, kingdoms and redemptions of one guild, all driven by the (guild_id, fid) key
+        self.cursor.execute('''
+            SELECT COUNT(*) AS players, COUNT(DISTINCT p.kid) AS kingdoms FROM player_guilds g
+            JOIN players p ON p.fid = g.fid WHERE g.guild_id = ?
+        ''', (guild_id,))
+        row = self.cursor.fetchone()
+        self.cursor.execute('''
+            SELECT COUNT(r.code) AS redemptions,
+                   COUNT(CASE WHEN r.redeemed_at > datetime('now', '-1 day') THEN 1 END) AS last_24h
+            FROM player_guilds g JOIN redemptions r ON r.fid = g.fid WHERE g.guild_id = ?
+        ''', (guild_id,))
+        activity = self.cursor.fetchone()
+        return {
+            "players": row['players'],
+            "kingdoms": row['kingdoms'],
+            "redemptions": activity['redemptions'],
+            "last_24h": activity['last_24h'],
+        }
+
+    @locked
     def show_all_players(self):
         self.cursor.execute('SELECT fid, nickname, kid FROM players')
         return self.cursor.fetchall()
     
+    @locked
     def get_all_fids(self):
         self.cursor.execute('SELECT fid FROM players')
         return [row['fid'] for row in self.cursor.fetchall()]
 
-    def check_codes_redeemed(self, fid):
-        self.cursor.execute('SELECT code FROM redemptions WHERE fid = ?', (fid,))
+    @locked
+    def check_codes_redeemed(self, fid, include_archived=False):
+        query = 'SELECT code FROM redemptions WHERE fid = ?'
+        if include_archived:
+            query = 'SELECT code FROM redemptions_archive WHERE fid = ? UNION ALL ' + query
+            self.cursor.execute(query, (fid, fid))
+        else:
+            self.cursor.execute(query, (fid,))
         return [row['code'] for row in self.cursor.fetchall()]
 
+    @locked
     def log_successful_redemption(self, fid, code_str, response):
         is_success = ( 
             (response.get('code') == 0) or 
@@ -149,14 +650,18 @@ class DatabaseManager:
                     (fid, code_str)
                 )
                 self.conn.commit()
+                if self.index is not None:
+                    self.index.mark_redeemed(fid, code_str)
                 if self.cursor.rowcount > 0:
+                    fields = {"fid": fid, "code": code_str, "err_code": response.get('err_code'), "sample": True}
                     if response.get('err_code') == 40011:
-                         self.logger.info(f"Logged code {code_str} for {fid} (Equivalent of this code was already redeemed).")
+                         self.logger.info(f"Logged code {code_str} for {fid} (Equivalent of this code was already redeemed).", extra=fields)
                     else:
-                         self.logger.info(f"Logged redeemed code {code_str} for {fid}.")
+                         self.logger.info(f"Logged redeemed code {code_str} for {fid}.", extra=fields)
             except Exception as e:
                 self.logger.error(f"Database error logging code: {e}")
 
+    @locked
     def show_full_table(self):
         query = '''
             SELECT p.fid, p.nickname, p.added_date, GROUP_CONCAT(r.code, ', ') as codes
@@ -173,38 +678,50 @@ class DatabaseManager:
             codes = p['codes'] if p['codes'] else "None"
             self.logger.info(f"{p['fid']:<15} | {p['nickname']:<15} | {codes}")
 
+    @locked
     def player_exists(self, fid):
         self.cursor.execute('SELECT 1 FROM players WHERE fid = ?', (fid,))
         return self.cursor.fetchone() is not None
     
+    @locked
     def get_player(self, fid):
         self.cursor.execute('SELECT fid, nickname, kid FROM players WHERE fid = ?', (fid,))
         return self.cursor.fetchone()
 
+    @locked
     def get_player_count(self):
         self.cursor.execute('SELECT COUNT(*) as count FROM players')
         return self.cursor.fetchone()['count']
     
+    @locked
     def get_kingdom_count(self):
         self.cursor.execute('SELECT COUNT(DISTINCT kid) as count FROM players')
         return self.cursor.fetchone()['count']
 
     def is_code_redeemed(self, fid, code):
-        self.cursor.execute('SELECT 1 FROM redemptions WHERE fid = ? AND code = ?', (fid, code))
-        return self.cursor.fetchone() is not None
+        if self.index is not None and self.index.get(fid) is not None:
+            return self.index.is_redeemed(fid, code)
+        with self.lock:
+            self.cursor.execute('SELECT 1 FROM redemptions WHERE fid = ? AND code = ?', (fid, code))
+            return self.cursor.fetchone() is not None
 
+    @locked
     def get_servers_stats(self):
         self.cursor.execute("SELECT kid, COUNT(fid) as player_count FROM players GROUP BY kid ORDER BY player_count DESC")
         return self.cursor.fetchall()
 
+    @locked
     def get_players_by_server(self, kid):
         self.cursor.execute("SELECT fid, nickname, kid FROM players WHERE kid = ?", (kid,))
         return self.cursor.fetchall()
 
+    @locked
     def get_redeemed_codes(self):
-        self.cursor.execute('SELECT DISTINCT code FROM redemptions')
+        # All-time: live codes plus the summaries of archived ones
+        self.cursor.execute('SELECT code FROM code_summaries UNION SELECT DISTINCT code FROM redemptions')
         return [row['code'] for row in self.cursor.fetchall()]
 
+    @locked
     def get_latest_redemption_info(self):
         query = '''
             SELECT code, redeemed_at 
@@ -234,5 +751,146 @@ class DatabaseManager:
             self.logger.error(f"Error fetching latest session info: {e}")
             return None
 
+    @locked
+    def get_archive_candidates(self, active_codes, min_age_days):
+        # Codes with no redemption for min_age_days that the persisted feed metadata shows as gone: past their
+        # expiry, or not reported by any feed for min_age_days. One fetch can miss a feed (grace period), so the
+        # live list only ever vetoes a candidate.
+        age = f"-{int(min_age_days)} days"
+        self.cursor.execute('''
+            SELECT r.code FROM (SELECT code, MAX(redeemed_at) AS last_redeemed FROM redemptions GROUP BY code) r
+            LEFT JOIN gift_codes g ON g.code = r.code
+            WHERE r.last_redeemed < datetime('now', ?)
+              AND (g.expires_at < CURRENT_TIMESTAMP OR g.last_seen_at IS NULL OR g.last_seen_at < datetime('now', ?))
+        ''', (age, age))
+        active = set(active_codes)
+        return [row['code'] for row in self.cursor.fetchall() if row['code'] not in active]
+
+    @locked
+    def archive_codes(self, codes):
+        # Moves every redemption of `codes` to the archive and folds them into code_summaries, in one transaction.
+        # Returns the number of rows moved out of the hot table.
+        if not codes:
+            return 0
+        moved = 0
+        try:
+            with self.conn:
+                for code in codes:
+                    self.conn.execute('''
+                        INSERT INTO code_summaries (code, redemptions, first_redeemed_at, last_redeemed_at)
+                        SELECT code, COUNT(*), MIN(redeemed_at), MAX(redeemed_at) FROM redemptions WHERE code = ? GROUP BY code
+                        ON CONFLICT (code) DO UPDATE SET
+                            redemptions = redemptions + excluded.redemptions,
+                            first_redeemed_at = MIN(first_redeemed_at, excluded.first_redeemed_at),
+                            last_redeemed_at = MAX(last_redeemed_at, excluded.last_redeemed_at),
+                            archived_at = CURRENT_TIMESTAMP
+                    ''', (code,))
+                    self.conn.execute(
+                        "INSERT OR IGNORE INTO redemptions_archive (fid, code, redeemed_at) "
+                        "SELECT fid, code, redeemed_at FROM redemptions WHERE code = ?", (code,)
+                    )
+                    moved += self.conn.execute("DELETE FROM redemptions WHERE code = ?", (code,)).rowcount
+            self.logger.info(f"Archived {len(codes)} expired codes ({moved} redemptions): {', '.join(codes)}")
+            return moved
+        except Exception as e:
+            self.logger.error(f"Database error archiving codes: {e}")
+            return 0
+
+    @locked
+    def restore_archived_codes(self, codes):
+        # A code that came back into the active list moves back to the hot table, so the cycle sees who already has it
+        try:
+            with self.conn:
+                restored, owners = [], []
+                for code in codes:
+                    owners.extend(self.conn.execute("SELECT fid, code FROM redemptions_archive WHERE code = ?", (code,)))
+                    self.conn.execute(
+                        "INSERT OR IGNORE INTO redemptions (fid, code, redeemed_at) "
+                        "SELECT fid, code, redeemed_at FROM redemptions_archive WHERE code = ?", (code,)
+                    )
+                    self.conn.execute("DELETE FROM redemptions_archive WHERE code = ?", (code,))
+                    if self.conn.execute("DELETE FROM code_summaries WHERE code = ?", (code,)).rowcount:
+                        restored.append(code)
+            if self.index is not None:
+                for fid, code in owners:  # Or the next cycle would resend the code to everyone who had it
+                    self.index.mark_redeemed(fid, code)
+            if restored:
+                self.logger.info(f"Restored {len(restored)} reactivated codes from the archive: {', '.join(restored)}")
+            return restored
+        except Exception as e:
+            self.logger.error(f"Database error restoring archived codes: {e}")
+            return []
+
+    @locked
+    def optimize(self, analyze=False):
+        # ANALYZE refreshes the planner statistics after a large archive move, PRAGMA optimize is the cheap routine version.
+        # incremental_vacuum hands the pages freed by the move back to the filesystem.
+        cursor = self.conn.cursor()
+        try:
+            self.conn.commit()
+            page_size = self.pragmas.get("page_size")
+            convert_vacuum = (str(self.pragmas.get("auto_vacuum", "")).upper() in ("INCREMENTAL", "2")
+                              and cursor.execute("PRAGMA auto_vacuum").fetchone()[0] != 2)
+            convert_pages = page_size is not None and cursor.execute("PRAGMA page_size").fetchone()[0] != int(page_size)
+            if convert_vacuum or convert_pages:
+                # One-time conversion to incremental auto-vacuum and the profile's page size (rewrites the file)
+                self.logger.info("Converting database layout (auto_vacuum / page_size) with a one-time VACUUM...")
+                wal = cursor.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal"
+                if convert_pages and wal:
+                    cursor.execute("PRAGMA journal_mode = DELETE")  # The page size can't change in WAL mode
+                cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                if convert_pages:
+                    cursor.execute(f"PRAGMA page_size = {int(page_size)}")
+                cursor.execute("VACUUM")
+                if convert_pages and wal:
+                    cursor.execute("PRAGMA journal_mode = WAL")
+            cursor.execute("ANALYZE" if analyze else "PRAGMA optimize")
+            free_pages = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+            self.conn.commit()
+            # executescript steps the pragma to completion; a plain execute() frees only the first page
+            cursor.executescript("PRAGMA incremental_vacuum;")
+            if cursor.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal":
+                cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")  # Fold the WAL into the database and reset it
+            return free_pages
+        except Exception as e:
+            self.logger.error(f"Database error during optimize: {e}")
+            return 0
+        finally:
+            cursor.close()
+
+    @locked
+    def get_storage_stats(self):
+        self.cursor.execute('''
+            SELECT (SELECT COUNT(*) FROM redemptions) AS hot_rows,
+                   (SELECT COUNT(*) FROM redemptions_archive) AS archived_rows,
+                   (SELECT COUNT(*) FROM code_summaries) AS archived_codes,
+                   (SELECT page_size FROM pragma_page_size()) AS page_size,
+                   (SELECT journal_mode FROM pragma_journal_mode()) AS journal_mode
+        ''')
+        return self.cursor.fetchone()
+
+    @locked
+    def load_index(self):
+        # One pass over players + redemptions; afterwards write methods keep the index in sync
+        index = PlayerIndex()
+        # Plain tuple cursors streamed straight into the index, no Row objects for the bulk load
+        players, redemptions = self.conn.cursor(), self.conn.cursor()
+        players.row_factory = redemptions.row_factory = None
+        index.load(
+            players.execute('SELECT fid, nickname, kid FROM players'),
+            redemptions.execute('SELECT fid, code FROM redemptions')
+        )
+        players.close()
+        redemptions.close()
+        self.index = index
+        return index
+
+    @locked
+    def get_indexed_players(self):
+        if self.index is None:
+            self.load_index()
+        return self.index.all_players()
+
+    @locked
     def close(self):
         self.conn.close()
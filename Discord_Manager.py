@@ -2,16 +2,28 @@ import logging
 import discord
 from discord.ext import commands, tasks
 from discord import app_commands
+import io
+import os
+import json
+import math
 import asyncio
+import hashlib
 import constants
-from main import KingshotBot
-from datetime import datetime, time, timezone
+from main import KingshotBot, setup_logging
+from Profiler_Manager import ProfileController, MemorySnapshots
+from datetime import datetime, time, timedelta, timezone
 
 intents = discord.Intents.default()
 intents.message_content = True 
-bot = commands.Bot(command_prefix="!", intents=intents)
+# One process with every shard by default; SHARD_COUNT/SHARD_IDS split the shards across processes
+SHARD_COUNT = getattr(constants, "SHARD_COUNT", None)
+SHARD_IDS = getattr(constants, "SHARD_IDS", None)
+bot = commands.AutoShardedBot(command_prefix="!", intents=intents, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS)
+COMMAND_HASH_FILE = os.path.join(constants.DATA_DIR, "command_tree.sha256")
 
-ks_bot = KingshotBot()
+ks_bot = KingshotBot()  # Lazy: DB and API are opened on first command/cycle
+profile_controller = ProfileController()
+mem_snapshots = MemorySnapshots()
 
 # --- CUSTOM CHECKS ---
 
@@ -20,6 +32,16 @@ async def is_bot_owner(interaction: discord.Interaction) -> bool:
         return True
     return False
 
+async def is_owner_or_admin(interaction: discord.Interaction) -> bool:
+    # Guild admins manage their own roster, the owner can see everything
+    if await is_bot_owner(interaction):
+        return True
+    return interaction.guild is not None and interaction.user.guild_permissions.administrator
+
+def is_scheduler_process() -> bool:
+    # The process hosting shard 0 owns the background tasks, the cycle and the global command sync
+    return SHARD_IDS is None or 0 in SHARD_IDS
+
 # --- INTERACTIVE VIEW ---
 
 class ConfirmView(discord.ui.View):
@@ -95,6 +117,25 @@ async def daily_redemption_task():
 async def before_daily_redemption():
     await bot.wait_until_ready()
 
+@tasks.loop(hours=1)
+async def profile_refresh_task():
+    # Low-priority sweep of the stalest profiles, pauses while a redemption cycle runs
+    await asyncio.to_thread(ks_bot.refresh_profiles)
+
+@profile_refresh_task.before_loop
+async def before_profile_refresh():
+    await bot.wait_until_ready()
+
+@tasks.loop(hours=24)
+async def maintenance_task():
+    # Archives expired codes and vacuums the DB, waits for a running redemption cycle first
+    await asyncio.to_thread(ks_bot.run_maintenance)
+
+@maintenance_task.before_loop
+async def before_maintenance():
+    await bot.wait_until_ready()
+    await asyncio.sleep(3600)  # Stay clear of the cycle that schedule_start launches right away
+
 # --- HELPER FUNCTIONS ---
 
 async def broadcast_stats(stats):
@@ -109,6 +150,12 @@ async def broadcast_stats(stats):
     embed.add_field(name="Total Players", value=str(stats['total_players']), inline=True)
     embed.add_field(name="Skipped (Full)", value=str(stats['skipped_full']), inline=True)
     embed.add_field(name="Dropped (Errors)", value=str(stats['skipped_error']), inline=True)
+    if stats.get('skipped_kingdom'):
+        embed.add_field(name="Skipped (Kingdom Ineligible)", value=str(stats['skipped_kingdom']), inline=True)
+    if stats.get('skipped_equivalent'):
+        embed.add_field(name="Saved (Equivalent Codes)", value=str(stats['skipped_equivalent']), inline=True)
+    if stats.get('skipped_tier'):
+        embed.add_field(name="Not Due (Dormant/Broken)", value=str(stats['skipped_tier']), inline=True)
     
     if stats['distribution']:
         dist_text = "\n".join([
@@ -122,24 +169,84 @@ async def broadcast_stats(stats):
     if stats['failed_players']:
         embed.add_field(name="Failed Players", value=", ".join(stats['failed_players']), inline=False)
 
-    channel_ids = ks_bot.db.get_all_target_channels()
-    for cid in channel_ids:
+    guild_stats = stats.get('guilds', {})
+    for registration in ks_bot.db.get_all_registrations():
+        cid = registration['target_channel_id']
+        report = embed
+        own = guild_stats.get(registration['guild_id'])
+        if own:
+            # Each server also sees how its own roster did
+            report = embed.copy()
+            value = f"**Players:** {own['players']} | **Codes redeemed:** {own['redeemed']}"
+            if own['failed']:
+                value += f"\n**Failed:** {', '.join(own['failed'])}"
+            report.insert_field_at(0, name="Your Server", value=value, inline=False)
         channel = bot.get_channel(cid) or await bot.fetch_channel(cid)
         if channel:
             try:
-                await channel.send(embed=embed)
+                await channel.send(embed=report)
             except discord.Forbidden:
                 logging.getLogger("BOT").warning(f"Permission denied to send messages in channel {cid}")
             except Exception as e:
                 logging.getLogger("BOT").error(f"Error broadcasting to channel {cid}: {e}")
 
+def command_tree_hash():
+    # Fingerprint of the payload tree.sync() would upload
+    payload = [command.to_dict(bot.tree) for command in bot.tree.get_commands()]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+async def sync_commands(force=False):
+    # Global sync only when the command set changed since the last one; returns the synced commands or None
+    digest = command_tree_hash()
+    try:
+        with open(COMMAND_HASH_FILE) as f:
+            previous = f.read().strip()
+    except OSError:
+        previous = None
+    if not force and digest == previous:
+        logging.getLogger("BOT").info("Slash commands unchanged, skipping sync.")
+        return None
+    synced = await bot.tree.sync()
+    # Only recorded once Discord accepted the sync (an exception above leaves the previous hash)
+    with open(COMMAND_HASH_FILE, "w") as f:
+        f.write(digest)
+    logging.getLogger("BOT").info(f"Synced {len(synced)} slash commands.")
+    return synced
+
+def format_latency(seconds):
+    return f"{round(seconds * 1000)}ms" if math.isfinite(seconds) else "n/a"
+
 # --- BOT EVENTS ---
 
+@bot.event
+async def setup_hook():
+    # Runs once per login, not on every reconnect like on_ready.
+    # Open the DB and load the player index off the event loop; sync handlers (/stats, /add, /delete...)
+    # would otherwise trigger the lazy load inline and stall the gateway for every shard.
+    await asyncio.to_thread(lambda: ks_bot.db)
+    if is_scheduler_process():
+        try:
+            await sync_commands()
+        except Exception as e:
+            # A transient Discord error must not stop the bot from starting; the hash file is left
+            # untouched, so the next start (or !sync) tries again
+            logging.getLogger("BOT").error(f"Slash command sync failed: {e}")
+
+@bot.event
+async def on_shard_ready(shard_id):
+    logging.getLogger("BOT").info(f"Shard {shard_id} ready.")
+
+@bot.event
+async def on_shard_resumed(shard_id):
+    logging.getLogger("BOT").info(f"Shard {shard_id} resumed.")
+
 @bot.event
 async def on_ready():
-    await bot.tree.sync() 
-    print(f"Logged in as {bot.user}")
-    print("Bot is ready. Scheduling is currently: OFF")
+    print(f"Logged in as {bot.user} | Shards {sorted(bot.shards)} of {bot.shard_count} | {len(bot.guilds)} servers")
+    if is_scheduler_process():
+        print("Bot is ready. Scheduling is currently: OFF")
+    else:
+        print("Bot is ready. Scheduling runs in the process hosting shard 0.")
 
 # --- SLASH COMMANDS ---
 
@@ -154,33 +261,42 @@ async def help_command(interaction: discord.Interaction):
             "**/delete [id]**: Remove a player from the list\n"
             "**/history [id]**: See redeemed codes for a player\n"
             "**/stats**: Show bot statistics\n"
-            "**/next**: See when the next auto-redemption cycle starts\n"
+            "**/next**: See when the next auto-redemption cycle starts (or the live ETA of a running one)\n"
             "**/servers_stats**: Show player distribution across servers\n"
             "**/redeem_for [id]**: Redeem all active codes for a specific player ID\n"
             "**/redeem_all**: Trigger a manual sync cycle *(Owner)*\n"
             "**/set_channel**: Set this channel for redemption reports *(Admins)*\n"
             "**/unset_channel**: Stop reports for this server *(Admins)*\n"
-            "**/list_players**: Show all registered players *(Owner)*\n"
+            "**/list_players**: Show this server's registered players *(Admins)*\n"
             "**/list_channels**: List all registered discord channels *(Owner)*\n"
             "**/list_server_players [kid]**: List all players in a specific server *(Owner)*\n"
             "**/schedule_start**: Start the 24h automatic loop *(Owner)*\n"
             "**/schedule_stop**: Stop the 24h automatic loop *(Owner)*\n"
-            "**/logs**: View recent bot activity logs *(Owner)*"
+            "**/plan**: Dry run of the next cycle: pending pairs, logins and duration estimate *(Owner)*\n"
+            "**/lanes**: API request latency per priority class and profile cache hit rate *(Owner)*\n"
+            "**/logs**: View recent bot activity logs *(Owner)*\n"
+            "**/profile_start** / **/profile_stop**: Profile the next cycle or a time window *(Owner)*\n"
+            "**/memsnap**: Diff tracemalloc snapshots to find memory growth *(Owner)*\n"
+            "**/export [format] [since]**: Download players, redemptions and cycle stats *(Owner)*"
         )
     embed.add_field(name="Available Commands", value=commands_text, inline=False)
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
-@bot.tree.command(name="ping", description="Check bot latency")
+@bot.tree.command(name="ping", description="Check bot latency per gateway shard")
 async def ping(interaction: discord.Interaction):
-    latency = round(bot.latency * 1000)
-    await interaction.response.send_message(f"🏓 Pong! Latency: `{latency}ms`", ephemeral=True)
+    shard_id = interaction.guild.shard_id if interaction.guild else 0
+    latencies = dict(bot.latencies)
+    message = f"🏓 Pong! Shard {shard_id} latency: `{format_latency(latencies.get(shard_id, bot.latency))}`"
+    if len(latencies) > 1:
+        message += "\n" + " | ".join(f"#{sid}: `{format_latency(latency)}`" for sid, latency in sorted(latencies.items()))
+    await interaction.response.send_message(message, ephemeral=True)
 
 @bot.command()
 async def sync(ctx):
     if await bot.is_owner(ctx.author):
         await ctx.send("Attempting to sync slash commands with Discord...")
         try:
-            synced = await bot.tree.sync()
+            synced = await sync_commands(force=True)
             await ctx.send(f"Success! Synced {len(synced)} slash commands.")
         except Exception as e:
             await ctx.send(f"Sync failed: {e}")
@@ -190,8 +306,14 @@ async def sync(ctx):
 @bot.tree.command(name="schedule_start", description="Start the 24-hour automatic redemption loop (Owner only)")
 @app_commands.check(is_bot_owner)
 async def schedule_start(interaction: discord.Interaction):
-    if not daily_redemption_task.is_running():
+    if not is_scheduler_process():
+        await interaction.response.send_message("ℹ️ The schedule runs in the process hosting shard 0.", ephemeral=True)
+    elif not daily_redemption_task.is_running():
         daily_redemption_task.start()
+        if not profile_refresh_task.is_running():
+            profile_refresh_task.start()
+        if not maintenance_task.is_running():
+            maintenance_task.start()
         await interaction.response.send_message("✅ 24-hour automatic redemption loop has been **STARTED**.", ephemeral=True)
     else:
         await interaction.response.send_message("ℹ️ The schedule is already running.", ephemeral=True)
@@ -199,8 +321,12 @@ async def schedule_start(interaction: discord.Interaction):
 @bot.tree.command(name="schedule_stop", description="Stop the 24-hour automatic redemption loop (Owner only)")
 @app_commands.check(is_bot_owner)
 async def schedule_stop(interaction: discord.Interaction):
-    if daily_redemption_task.is_running():
+    if not is_scheduler_process():
+        await interaction.response.send_message("ℹ️ The schedule runs in the process hosting shard 0.", ephemeral=True)
+    elif daily_redemption_task.is_running():
         daily_redemption_task.cancel()
+        profile_refresh_task.cancel()
+        maintenance_task.cancel()
         await interaction.response.send_message("🛑 24-hour automatic redemption loop has been **STOPPED**.", ephemeral=True)
     else:
         await interaction.response.send_message("ℹ️ The schedule is not currently running.", ephemeral=True)
@@ -211,7 +337,7 @@ async def schedule_stop(interaction: discord.Interaction):
 async def find(interaction: discord.Interaction, fid: str):
     await interaction.response.defer(ephemeral=True)
     
-    player_data = ks_bot.api.get_player_info(fid)
+    player_data = await asyncio.to_thread(ks_bot.lookup_player, fid)
     if player_data:
         existing_player = ks_bot.db.get_player(fid)
         if existing_player and (existing_player['nickname'] != player_data['nickname'] or existing_player['kid'] != player_data['kid']):
@@ -239,10 +365,15 @@ async def add(interaction: discord.Interaction, fid: str):
     await interaction.response.defer(ephemeral=True)
 
     if ks_bot.db.player_exists(fid):
-        await interaction.followup.send(f"Player with ID {fid} is already in the list.", ephemeral=True)
+        # Already redeemed for by another server: just add them to this server's roster
+        if interaction.guild_id is not None and ks_bot.db.link_player_to_guild(fid, interaction.guild_id):
+            player = ks_bot.db.get_player(fid)
+            await interaction.followup.send(f"Player **{player['nickname']}** has been added to this server's list.", ephemeral=True)
+        else:
+            await interaction.followup.send(f"Player with ID {fid} is already in the list.", ephemeral=True)
         return
 
-    player_data = ks_bot.api.get_player_info(fid)
+    player_data = await asyncio.to_thread(ks_bot.lookup_player, fid)
     if not player_data:
         await interaction.followup.send(f"Could not find a player with ID {fid}.", ephemeral=True)
         return
@@ -256,7 +387,7 @@ async def add(interaction: discord.Interaction, fid: str):
     await view.wait()
 
     if view.value is True:
-        ks_bot.db._save_player_to_db(player_data)
+        ks_bot.db._save_player_to_db(player_data, interaction.guild_id)
         await message.edit(content=f"Player **{player_data['nickname']}** has been added.", embed=None, view=None)
     else:
         await message.edit(content="Action cancelled.", embed=None, view=None)
@@ -272,23 +403,40 @@ async def delete(interaction: discord.Interaction, fid: str):
         await interaction.followup.send(f"Player ID {fid} is not in the list.", ephemeral=True)
         return
 
+    # A server can only remove its own roster link; players added before rosters (no links) are owner-only
+    guilds = ks_bot.db.get_player_guilds(fid)
+    if interaction.guild_id not in guilds and (guilds or not await is_bot_owner(interaction)):
+        await interaction.followup.send(f"Player ID {fid} is not on this server's list.", ephemeral=True)
+        return
+
     view = ConfirmView()
     embed = discord.Embed(title="Confirm Delete", description=f"Delete **{player_record['nickname']}**?", color=discord.Color.red())
     message = await interaction.followup.send(embed=embed, view=view, wait=True, ephemeral=True)
     await view.wait()
 
     if view.value is True:
-        ks_bot.db._delete_player(fid)
-        await message.edit(content=f"Deleted **{player_record['nickname']}** ({fid}).", embed=None, view=None)
+        remaining = ks_bot.db.unlink_player_from_guild(fid, interaction.guild_id) if guilds else 0
+        if remaining is None:
+            await message.edit(content="❌ Could not update the list, please try again.", embed=None, view=None)
+        elif remaining:
+            # Other servers still follow this player: only this server's roster changes
+            await message.edit(content=f"Removed **{player_record['nickname']}** ({fid}) from this server's list.", embed=None, view=None)
+        else:
+            ks_bot.db._delete_player(fid)
+            await message.edit(content=f"Deleted **{player_record['nickname']}** ({fid}).", embed=None, view=None)
     else:
         await message.edit(content="Action cancelled.", embed=None, view=None)
 
-@bot.tree.command(name="list_players", description="Show all registered players with pagination")
-@app_commands.check(is_bot_owner)
-async def list_registered_players(interaction: discord.Interaction):
+@bot.tree.command(name="list_players", description="Show this server's registered players with pagination")
+@app_commands.describe(all_servers="Owner only: list the players of every server")
+@app_commands.check(is_owner_or_admin)
+async def list_registered_players(interaction: discord.Interaction, all_servers: bool = False):
     await interaction.response.defer(ephemeral=True)
     
-    players = ks_bot.db.show_all_players() #
+    if interaction.guild_id is None or (all_servers and await is_bot_owner(interaction)):
+        players = ks_bot.db.show_all_players()
+    else:
+        players = ks_bot.db.get_guild_players(interaction.guild_id)
     if not players:
         await interaction.followup.send("The list is empty.", ephemeral=True)
         return
@@ -302,11 +450,26 @@ async def stats(interaction: discord.Interaction):
     kingdom_count = ks_bot.db.get_kingdom_count()
     all_codes = ks_bot.db.get_redeemed_codes()
     session_info = ks_bot.db.get_latest_redemption_info()
+    tier_counts = ks_bot.db.get_tier_counts()
+    storage = ks_bot.db.get_storage_stats()
+    guild_stats = ks_bot.db.get_guild_stats(interaction.guild_id) if interaction.guild_id is not None else None
     
     embed = discord.Embed(title="System Statistics", color=0x66ccff)
+    if guild_stats and guild_stats['players']:
+        embed.add_field(
+            name="This Server",
+            value=f"**Players:** {guild_stats['players']} | **Kingdoms:** {guild_stats['kingdoms']}\n"
+                  f"**Redemptions:** {guild_stats['redemptions']} ({guild_stats['last_24h']} in the last 24h)",
+            inline=False
+        )
     embed.add_field(name="Registered Players", value=str(layers_count), inline=True)
     embed.add_field(name="Kingdoms", value=str(kingdom_count), inline=True)
     embed.add_field(name="Total Codes Redeemed", value=str(len(all_codes)), inline=True)
+    if tier_counts:
+        tiers_str = " | ".join(f"{tier}: {tier_counts[tier]}" for tier in ("hot", "normal", "dormant", "broken") if tier in tier_counts)
+        embed.add_field(name="Activity Tiers", value=tiers_str, inline=False)
+    if storage['archived_codes']:
+        embed.add_field(name="Redemption Rows", value=f"Live: {storage['hot_rows']} | Archived: {storage['archived_rows']} ({storage['archived_codes']} expired codes)", inline=False)
     
     if session_info:
         codes_str = ", ".join(session_info['codes'])
@@ -315,9 +478,39 @@ async def stats(interaction: discord.Interaction):
     embed.add_field(name="All-Time Codes", value=", ".join(all_codes) if all_codes else "None", inline=False)
     await interaction.followup.send(embed=embed, ephemeral=True)
 
+@bot.tree.command(name="lanes", description="API request latency per priority class (Owner Only)")
+@app_commands.check(is_bot_owner)
+async def lanes(interaction: discord.Interaction):
+    def fmt(seconds):
+        return f"{seconds:.1f}s" if seconds is not None else "-"
+
+    embed = discord.Embed(title="Request Scheduler", color=0x66ccff)
+    for lane, m in ks_bot.api.scheduler.snapshot().items():
+        embed.add_field(
+            name=lane.capitalize(),
+            value=(f"Requests: {m['requests']}\n"
+                   f"Queue wait p50/p95: {fmt(m['wait_p50'])} / {fmt(m['wait_p95'])}\n"
+                   f"Latency p50/p95: {fmt(m['latency_p50'])} / {fmt(m['latency_p95'])}"),
+            inline=True
+        )
+    cache = ks_bot.profiles.stats()
+    hit_rate = f"{cache['hit_rate'] * 100:.0f}%" if cache['hit_rate'] is not None else "-"
+    embed.add_field(
+        name="Profile Cache",
+        value=(f"Entries: {cache['size']}/{cache['maxsize']} | Hit rate: {hit_rate}\n"
+               f"Hits: {cache['hits']} | Negative hits: {cache['negative_hits']} | Coalesced: {cache['coalesced']}\n"
+               f"Misses: {cache['misses']} | Evictions: {cache['evictions']}"),
+        inline=False
+    )
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
 @bot.tree.command(name="redeem_all", description="Force manual redemption (Owner Only)")
 @app_commands.check(is_bot_owner)
 async def redeem_all(interaction: discord.Interaction):
+    if not is_scheduler_process():
+        # The cycle guard (cycle_active) is per process
+        await interaction.response.send_message("ℹ️ Cycles run in the process hosting shard 0.", ephemeral=True)
+        return
     await interaction.response.send_message("🚀 Starting manual cycle. Summary will be posted to all registered channels.", ephemeral=True)
     
     stats = await asyncio.to_thread(ks_bot.run_redemption_cycle)
@@ -335,6 +528,85 @@ async def logs(interaction: discord.Interaction, lines: int = 10):
     except Exception as e:
         await interaction.followup.send(f"Error: {e}", ephemeral=True)
 
+@bot.tree.command(name="profile_start", description="Profile the next redemption cycle or a time window (Owner Only)")
+@app_commands.describe(mode="cycle: the next redemption cycle, window: all threads for N seconds", seconds="Window length (window mode)")
+@app_commands.choices(mode=[app_commands.Choice(name="cycle", value="cycle"), app_commands.Choice(name="window", value="window")])
+@app_commands.check(is_bot_owner)
+async def profile_start(interaction: discord.Interaction, mode: str = "cycle", seconds: int = 60):
+    if profile_controller.mode is not None:
+        await interaction.response.send_message("ℹ️ A profile is already in progress. Use `/profile_stop` first.", ephemeral=True)
+        return
+
+    if mode == "window":
+        profile_controller.start_window(seconds)
+        message = f"🔬 Profiling all threads for up to {seconds}s. Use `/profile_stop` to get the report."
+    else:
+        profile_controller.arm_cycle()
+        ks_bot.profiler = profile_controller
+        message = "🔬 The next redemption cycle will be profiled. Use `/profile_stop` after it finishes."
+    await interaction.response.send_message(message, ephemeral=True)
+
+@bot.tree.command(name="profile_stop", description="Stop profiling and get the hot-function report (Owner Only)")
+@app_commands.check(is_bot_owner)
+async def profile_stop(interaction: discord.Interaction):
+    await interaction.response.defer(ephemeral=True)
+    ks_bot.profiler = None
+    result = await asyncio.to_thread(profile_controller.stop)
+
+    if result is None or not result.samples:
+        await interaction.followup.send("No profile data collected (did the cycle run?).", ephemeral=True)
+        return
+
+    summary = result.summary()
+    files = [
+        discord.File(io.BytesIO(result.folded().encode("utf-8")), filename="profile.folded"),
+        discord.File(io.BytesIO(summary.encode("utf-8")), filename="profile_summary.txt"),
+    ]
+    await interaction.followup.send(f"```text\n{summary[:1900]}\n```", files=files, ephemeral=True)
+
+@bot.tree.command(name="memsnap", description="Take a tracemalloc snapshot and diff it with the previous one (Owner Only)")
+@app_commands.choices(action=[app_commands.Choice(name="take", value="take"), app_commands.Choice(name="stop", value="stop")])
+@app_commands.check(is_bot_owner)
+async def memsnap(interaction: discord.Interaction, action: str = "take"):
+    await interaction.response.defer(ephemeral=True)
+    if action == "stop":
+        mem_snapshots.stop()
+        await interaction.followup.send("tracemalloc stopped.", ephemeral=True)
+        return
+
+    report = await asyncio.to_thread(mem_snapshots.take)
+    file = discord.File(io.BytesIO(report.encode("utf-8")), filename="memsnap.txt")
+    await interaction.followup.send(f"```text\n{report[:1900]}\n```", file=file, ephemeral=True)
+
+@bot.tree.command(name="export", description="Export players, redemptions and cycle stats as a zip (Owner Only)")
+@app_commands.describe(format="File format inside the archive", since="Only rows added/changed since this UTC time (YYYY-MM-DD[ HH:MM:SS])")
+@app_commands.choices(format=[app_commands.Choice(name=f, value=f) for f in ("jsonl", "csv", "parquet")])
+@app_commands.check(is_bot_owner)
+async def export(interaction: discord.Interaction, format: str = "jsonl", since: str = None):
+    await interaction.response.defer(ephemeral=True)
+
+    export_dir = os.path.join(constants.DATA_DIR, "exports")
+    os.makedirs(export_dir, exist_ok=True)
+    filename = f"kingshot_export_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}.zip"
+    path = os.path.join(export_dir, filename)
+
+    try:
+        manifest = await asyncio.to_thread(ks_bot.export_data, path, format, since)
+        rows = ", ".join(f"{table}: {count}" for table, count in manifest['rows'].items())
+        limit = interaction.guild.filesize_limit if interaction.guild else 10 * 1024 * 1024
+        if os.path.getsize(path) > limit:
+            await interaction.followup.send(
+                f"Export too large to upload ({rows}). Use a later `since` or run `python main.py export` on the server.",
+                ephemeral=True
+            )
+            return
+        await interaction.followup.send(f"📦 Export ready ({rows}).", file=discord.File(path, filename=filename), ephemeral=True)
+    except ValueError as e:
+        await interaction.followup.send(f"❌ {e}", ephemeral=True)
+    finally:
+        if os.path.exists(path):
+            os.remove(path)  # The upload is the copy; don't let exports pile up on the volume
+
 @bot.tree.command(name="history", description="Check player history")
 @app_commands.rename(fid="id")
 async def history(interaction: discord.Interaction, fid: str):
@@ -344,27 +616,74 @@ async def history(interaction: discord.Interaction, fid: str):
         await interaction.followup.send(f"ID {fid} not found.", ephemeral=True)
         return
 
-    codes = ks_bot.db.check_codes_redeemed(fid)
+    codes = ks_bot.db.check_codes_redeemed(fid, include_archived=True)
     embed = discord.Embed(title=f"History: {player['nickname']}", description=f"ID: `{fid}`", color=0x66ccff)
     embed.add_field(name="Redeemed Codes", value=", ".join(codes) if codes else "None", inline=False)
     await interaction.followup.send(embed=embed, ephemeral=True)
 
+def format_duration(seconds):
+    return str(timedelta(seconds=round(seconds)))
+
 @bot.tree.command(name="next", description="Time until next auto-sync")
 async def next_cycle(interaction: discord.Interaction):
-    if daily_redemption_task.is_running():
+    progress = ks_bot.progress
+    if progress is not None:
+        eta = progress.eta()
+        await interaction.response.send_message(
+            f"Cycle running: `{eta['done']}/{eta['planned']}` requests, "
+            f"`{format_duration(eta['remaining_s'])}` left (ETA {eta['finish_at'].strftime('%H:%M')} UTC).",
+            ephemeral=True
+        )
+    elif daily_redemption_task.is_running():
         next_it = daily_redemption_task.next_iteration
         remaining = next_it - datetime.now(timezone.utc) if next_it else "Calculating..."
-        await interaction.response.send_message(f"Next cycle in: `{str(remaining).split('.')[0]}`", ephemeral=True)
+        message = f"Next cycle in: `{str(remaining).split('.')[0]}`"
+        if ks_bot.last_active_codes is not None:
+            # Estimate from the last known code list, no API request
+            plan = await asyncio.to_thread(ks_bot.plan_cycle, refresh_codes=False)
+            message += f"\nExpected duration: `{format_duration(plan['duration_s'])}` ({plan['requests']} requests)"
+        await interaction.response.send_message(message, ephemeral=True)
+    elif not is_scheduler_process():
+        await interaction.response.send_message("ℹ️ The schedule runs in the process hosting shard 0.", ephemeral=True)
     else:
         await interaction.response.send_message("❌ Task not running.", ephemeral=True)
 
+@bot.tree.command(name="plan", description="Dry run of the next redemption cycle (Owner Only)")
+@app_commands.check(is_bot_owner)
+async def cycle_plan(interaction: discord.Interaction):
+    await interaction.response.defer(ephemeral=True)
+    plan = await asyncio.to_thread(ks_bot.plan_cycle)
+    if not plan['codes']:
+        await interaction.followup.send("No active codes found at the moment.", ephemeral=True)
+        return
+
+    embed = discord.Embed(title="Cycle Plan (Dry Run)", color=0x66ccff)
+    embed.add_field(name="Players Due", value=f"{plan['players_due']} in {plan['kingdoms']} kingdoms", inline=True)
+    embed.add_field(name="Not Due (Tiers)", value=str(plan['players_skipped_tier']), inline=True)
+    embed.add_field(name="Requests", value=f"{plan['logins']} logins + {plan['pairs']} redemptions", inline=True)
+    embed.add_field(
+        name="Estimate",
+        value=(f"Duration: `{format_duration(plan['duration_s'])}` at {plan['seconds_per_request']:.1f}s/request "
+               f"({'recent cycles' if plan['pace_source'] == 'history' else 'rate limits'})\n"
+               f"Finishes ~{plan['finish_at'].strftime('%Y-%m-%d %H:%M')} UTC if started now"),
+        inline=False
+    )
+    pending = "\n".join(
+        f"• **{code}**: {plan['pending_by_code'][code]} players"
+        + (f" (expires {plan['deadlines'][code]} UTC)" if plan['deadlines'].get(code) else "")
+        + (" ⚠️ urgent" if code in plan['urgent'] else "")
+        for code in plan['codes']
+    )
+    embed.add_field(name="Pending by Code", value=pending[:1024], inline=False)
+    await interaction.followup.send(embed=embed, ephemeral=True)
+
 @bot.tree.command(name="redeem_for", description="Redeem all active codes for a specific player ID")
 @app_commands.rename(fid="id")
 @app_commands.describe(fid="The player ID to redeem codes for")
 async def redeem_for(interaction: discord.Interaction, fid: str):
     await interaction.response.defer(ephemeral=True)
     
-    response = await asyncio.to_thread(ks_bot.redeem_for_player, fid)
+    response = await asyncio.to_thread(ks_bot.redeem_for_player, fid, interaction.guild_id)
 
     if response["status"] == "error":
         await interaction.followup.send(f"Error: {response['msg']}", ephemeral=True)
@@ -477,4 +796,5 @@ async def on_app_command_error(interaction: discord.Interaction, error: app_comm
         await interaction.response.send_message(message, ephemeral=True)
 
 if __name__ == "__main__":
-    bot.run(constants.DISCORD_TOKEN)
\ No newline at end of file
+    setup_logging()
+    bot.run(constants.DISCORD_TOKEN, log_handler=None)  # discord.* logs go through our queue pipeline
\ No newline at end of file
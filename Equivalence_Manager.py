@@ -0,0 +1,121 @@
+import logging
+from collections import defaultdict
+
+class CodeEquivalence:
+    # Groups of codes the server treats as the same reward (err_code 40011: "an equivalent code was already redeemed").
+    # Learned from 40011 responses, persisted in code_equivalents and applied through the player index bitmasks.
+    # Links stay provisional: a few owners of a partner code are still sent the code (a success disproves
+    # the link, since 40011 may point at a code we don't track), and every link expires after max_age_hours.
+    def __init__(self, db, threshold=3, probes=3, max_age_hours=72):
+        self.logger = logging.getLogger("MAIN")
+        self.db = db
+        self.threshold = threshold             # Distinct players pointing at the same pair before it is linked
+        self.probe_size = probes               # Partner owners per linked code still sent the code
+        self.max_age_hours = max_age_hours
+        self.votes = defaultdict(set)          # {(code, other): {fids whose 40011 on code could be explained by other}}
+        self.disproven = set()                 # {frozenset((code, other))} pairs a real success contradicted
+        self._load()
+
+    def _load(self):
+        self.group_of = self.db.get_code_groups()   # {code: group_id}
+        self.members = {}                           # {group_id: {codes}}
+        for code, group_id in self.group_of.items():
+            self.members.setdefault(group_id, set()).add(code)
+        self.probes = defaultdict(set)              # {code: {fids sent code despite owning a partner}}
+
+    def expire(self):
+        # Drops links older than max_age_hours; still-true pairs are learned again from probe 40011s
+        expired = self.db.expire_code_equivalents(self.max_age_hours)
+        if expired:
+            self.logger.info(f"Expired equivalent code links: {', '.join(sorted(expired))}")
+            self._load()
+
+    def equivalents(self, code):
+        group_id = self.group_of.get(code)
+        if group_id is None:
+            return set()
+        return self.members[group_id] - {code}
+
+    def satisfied_by(self, record, code):
+        # Returns the equivalent code this player already has, or None.
+        # The first probe_size partner owners asked about a code are probes and get None (same answer on every call).
+        index = self.db.index
+        for other in self.equivalents(code):
+            bit = index.code_ids.get(other)
+            if bit is not None and record.redeemed >> bit & 1:
+                probes = self.probes[code]
+                if record.fid in probes:
+                    return None
+                if len(probes) < self.probe_size:
+                    probes.add(record.fid)
+                    return None
+                return other
+        return None
+
+    def observe_40011(self, record, code, active_codes):
+        # The equivalent must be one of the active codes this player already has (or one we don't track).
+        # Every owned candidate gets this player's vote; a pair is linked once `threshold` distinct players
+        # back it and no other candidate of the code has as many votes.
+        index = self.db.index
+        known = self.equivalents(code)
+        owned = {
+            other for other in active_codes
+            if other != code and other not in known
+            and frozenset((code, other)) not in self.disproven
+            and other in index.code_ids and record.redeemed >> index.code_ids[other] & 1
+        }
+        for other in owned:
+            self.votes[(code, other)].add(record.fid)
+        if not owned:
+            return None
+
+        counts = sorted(((len(self.votes[(code, other)]), other) for other in owned), reverse=True)
+        best, other = counts[0]
+        if best < self.threshold or (len(counts) > 1 and counts[1][0] == best):
+            return None
+        self._link(code, other)
+        for key in [key for key in self.votes if code in key or other in key]:
+            del self.votes[key]
+        return other
+
+    def observe_success(self, record, code):
+        # A real success on a linked code for a player who owns one of its partners disproves the link
+        index = self.db.index
+        for other in self.equivalents(code):
+            bit = index.code_ids.get(other)
+            if bit is not None and record.redeemed >> bit & 1:
+                self.disproven.add(frozenset((code, other)))
+                self._unlink(code)
+                return other
+        return None
+
+    def _link(self, code, other):
+        group = {code, other} | self.equivalents(code) | self.equivalents(other)
+        group_id = min(group)
+        for old_id in {self.group_of.get(c) for c in group} - {None}:
+            self.members.pop(old_id, None)
+        for member in group:
+            self.group_of[member] = group_id
+        self.members[group_id] = group
+        for member in group:
+            self.probes.pop(member, None)
+        self.db.save_code_group(group_id, group)
+        self.logger.info(f"Learned equivalent codes: {', '.join(sorted(group))}")
+
+    def _unlink(self, code):
+        group = self.members.pop(self.group_of.pop(code))
+        group.discard(code)
+        self.probes.pop(code, None)
+        removed = [code]
+        if len(group) > 1:
+            group_id = min(group)
+            for member in group:
+                self.group_of[member] = group_id
+            self.members[group_id] = group
+            self.db.save_code_group(group_id, group)
+        else:
+            for member in group:
+                del self.group_of[member]
+            removed.extend(group)
+        self.db.delete_code_equivalents(removed)
+        self.logger.warning(f"Code {code} was redeemed next to a supposed equivalent, dropped it from its group.")
@@ -0,0 +1,133 @@
+import io
+import os
+import csv
+import json
+import logging
+import zipfile
+import tempfile
+from datetime import datetime, timezone
+
+FORMATS = ("jsonl", "csv", "parquet")
+PARQUET_CHUNK = 10000
+
+def normalize_since(since):
+    # Accepts "YYYY-MM-DD", "YYYY-MM-DD HH:MM:SS" or ISO "YYYY-MM-DDTHH:MM:SS[Z]" (UTC), like the DB timestamps
+    if not since:
+        return None
+    since = since.strip().replace("T", " ").rstrip("Z")
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(since, fmt).strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid timestamp '{since}', expected YYYY-MM-DD[ HH:MM:SS]")
+
+def _require_pyarrow():
+    # Optional dependency, only needed for Parquet
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Parquet export needs pyarrow (pip install pyarrow)")
+    return pa, pq
+
+class Exporter:
+    # Streams players, redemptions and cycle stats into one zip archive (one member per table).
+    # Rows flow cursor -> writer -> deflate stream, so memory stays flat regardless of table size.
+    def __init__(self, db):
+        self.logger = logging.getLogger("DB")
+        self.db = db
+
+    def export(self, path, fmt="jsonl", since=None):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown export format '{fmt}', expected one of {', '.join(FORMATS)}")
+        if fmt == "parquet":
+            _require_pyarrow()
+        since = normalize_since(since)
+        tables = {
+            "players": self.db.stream_players(since),
+            "redemptions": self.db.stream_redemptions(since),
+            "cycle_stats": self.db.stream_cycle_stats(since),
+        }
+
+        counts = {}
+        with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for table, rows in tables.items():
+                member = f"{table}.{fmt}"
+                if fmt == "parquet":
+                    counts[table] = self._write_parquet(archive, member, rows)
+                else:
+                    info = zipfile.ZipInfo(member, date_time=datetime.now(timezone.utc).timetuple()[:6])
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                    with archive.open(info, "w", force_zip64=True) as raw:
+                        text = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+                        counts[table] = self._write_csv(text, rows) if fmt == "csv" else self._write_jsonl(text, rows)
+                        text.flush()
+                        text.detach()
+
+            manifest = {
+                "generated_at": datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+                "since": since,
+                "format": fmt,
+                "rows": counts,
+            }
+            archive.writestr("manifest.json", json.dumps(manifest, indent=2))
+
+        self.logger.info(f"Exported {counts} to {path}" + (f" (since {since})" if since else ""))
+        return manifest
+
+    @staticmethod
+    def _write_csv(out, rows):
+        writer = csv.writer(out)
+        writer.writerow(next(rows))
+        count = 0
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+        return count
+
+    @staticmethod
+    def _write_jsonl(out, rows):
+        columns = next(rows)
+        count = 0
+        for row in rows:
+            out.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+            out.write("\n")
+            count += 1
+        return count
+
+    @staticmethod
+    def _write_parquet(archive, member, rows):
+        pa, pq = _require_pyarrow()
+        columns = next(rows)
+        count = 0
+        # Parquet needs a seekable sink: write row groups to a temp file, then stream it into the zip
+        with tempfile.NamedTemporaryFile(suffix=".parquet", delete=False) as tmp:
+            tmp_path = tmp.name
+        try:
+            writer = None
+            chunk = []
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) >= PARQUET_CHUNK:
+                    writer = Exporter._parquet_chunk(pa, pq, writer, tmp_path, columns, chunk)
+                    count += len(chunk)
+                    chunk = []
+            if chunk or writer is None:
+                writer = Exporter._parquet_chunk(pa, pq, writer, tmp_path, columns, chunk)
+                count += len(chunk)
+            writer.close()
+            archive.write(tmp_path, member)
+        finally:
+            os.remove(tmp_path)
+        return count
+
+    @staticmethod
+    def _parquet_chunk(pa, pq, writer, path, columns, chunk):
+        table = pa.table({name: [row[i] for row in chunk] for i, name in enumerate(columns)})
+        if writer is None:
+            # All-NULL columns in the first chunk would be typed "null"; store them as strings instead
+            schema = pa.schema([(f.name, pa.string() if pa.types.is_null(f.type) else f.type) for f in table.schema])
+            writer = pq.ParquetWriter(path, schema)
+        writer.write_table(table.cast(writer.schema) if table.schema != writer.schema else table)
+        return writer
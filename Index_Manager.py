@@ -0,0 +1,135 @@
+import sys
+import logging
+import threading
+from contextlib import contextmanager
+
+class PlayerRecord:
+    __slots__ = ("fid", "kid", "nickname", "redeemed")
+
+    def __init__(self, fid, nickname, kid, redeemed=0):
+        self.fid = fid
+        self.nickname = nickname
+        self.kid = kid
+        self.redeemed = redeemed  # Bitmask over PlayerIndex code ids
+
+    # Row-style access so records can be passed where sqlite3.Row was used
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+class IndexGate:
+    # Readers (the cycle, /redeem_for, the planner) hold PlayerRecords and bit ids across many calls.
+    # Maintenance swaps the whole index: it waits until no reader is active and holds new ones off meanwhile.
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.readers = 0
+        self.writing = False
+
+    @contextmanager
+    def shared(self):
+        with self.cond:
+            while self.writing:
+                self.cond.wait()
+            self.readers += 1
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.readers -= 1
+                self.cond.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        with self.cond:
+            while self.writing or self.readers:
+                self.cond.wait()
+            self.writing = True
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.writing = False
+                self.cond.notify_all()
+
+class PlayerIndex:
+    # In-memory mirror of players + redemptions, kept in sync by DatabaseManager writes.
+    def __init__(self):
+        self.logger = logging.getLogger("DB")
+        self.players = {}    # {fid: PlayerRecord}
+        self.code_ids = {}   # {code: bit position}
+        self.codes = []      # [code] by bit position
+        # Bit assignment and mask updates are read-modify-write; the cycle, to_thread commands,
+        # the refresh sweep and maintenance all write, reads stay lock-free
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _key(fid):
+        # Discord passes ids as str, the DB stores INTEGER
+        try:
+            return int(fid)
+        except (TypeError, ValueError):
+            return fid
+
+    def code_bit(self, code):
+        with self.lock:
+            return self._code_bit(code)
+
+    def _code_bit(self, code):
+        bit = self.code_ids.get(code)
+        if bit is None:
+            bit = len(self.codes)
+            self.code_ids[code] = bit
+            self.codes.append(code)
+        return 1 << bit
+
+    def load(self, player_rows, redemption_rows):
+        with self.lock:
+            self.players.clear()
+            for row in player_rows:
+                nickname = sys.intern(row[1]) if row[1] else row[1]
+                self.players[row[0]] = PlayerRecord(row[0], nickname, row[2])
+            players = self.players
+            bits = {}
+            for fid, code in redemption_rows:
+                record = players.get(fid)
+                if record is not None:
+                    bit = bits.get(code)
+                    if bit is None:
+                        bit = bits[code] = self._code_bit(code)
+                    record.redeemed |= bit
+        self.logger.info(f"Player index loaded: {len(self.players)} players, {len(self.codes)} codes.")
+
+    def get(self, fid):
+        return self.players.get(self._key(fid))
+
+    def all_players(self):
+        return list(self.players.values())
+
+    def add_player(self, fid, nickname, kid, codes=()):
+        record = PlayerRecord(self._key(fid), sys.intern(nickname) if nickname else nickname, kid)
+        with self.lock:
+            for code in codes:
+                record.redeemed |= self._code_bit(code)
+            self.players[record.fid] = record
+        return record
+
+    def remove_player(self, fid):
+        self.players.pop(self._key(fid), None)
+
+    def update_player(self, fid, nickname, kid):
+        record = self.players.get(self._key(fid))
+        if record is not None:
+            record.nickname = sys.intern(nickname) if nickname else nickname
+            record.kid = kid
+
+    def mark_redeemed(self, fid, code):
+        record = self.players.get(self._key(fid))
+        if record is not None:
+            with self.lock:
+                record.redeemed |= self._code_bit(code)
+
+    def is_redeemed(self, fid, code):
+        record = self.players.get(self._key(fid))
+        bit = self.code_ids.get(code)
+        if record is None or bit is None:
+            return False
+        return bool(record.redeemed >> bit & 1)
@@ -0,0 +1,107 @@
+import sys
+import copy
+import json
+import time
+import queue
+import atexit
+import logging
+import itertools
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+import constants
+
+# Structured fields that callers may attach with extra={...}
+STRUCTURED_FIELDS = ("fid", "code", "err_code", "latency_ms")
+
+class DiscordNameFilter(logging.Filter):
+    def filter(self, record):
+        if record.name.startswith("discord"):
+            record.name = "BOT"
+        return True
+
+class SuccessSampler(logging.Filter):
+    # Keeps 1 of every `rate` records logged with extra={"sample": True} (high-volume success lines).
+    # Warnings/errors and unmarked lines always pass.
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = max(1, rate)
+        self.counter = itertools.count()
+
+    def filter(self, record):
+        if self.rate == 1 or not getattr(record, "sample", False):
+            return True
+        return next(self.counter) % self.rate == 0
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "name": record.name,
+            "msg": record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+class StructuredQueueHandler(QueueHandler):
+    # The stock prepare() folds the traceback into msg and clears exc_info. Render it into exc_text
+    # instead (traceback objects stay on the calling thread), so each formatter places it itself:
+    # after the message in text logs, as its own "exc" field in JSON logs.
+    def prepare(self, record):
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        return record
+
+_listener = None
+
+def setup_logging():
+    # Callers only enqueue records; formatting and file/stdout I/O happen on the listener thread.
+    # Called by the entry points only, importing the app modules has no logging side effects.
+    global _listener
+    if _listener is not None:
+        return
+
+    logging.Formatter.converter = time.gmtime
+    datefmt = '%Y-%m-%d %H:%M:%S'
+
+    file_handler = RotatingFileHandler(
+        constants.LOG_FILE,
+        maxBytes= 5*1024*1024, # 5 MB per file
+        backupCount=3,        # Keep 3 old log files (15MB total max)
+        encoding='utf-8'
+    )
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+
+    text_formatter = logging.Formatter('%(asctime)s | %(levelname)-8s | %(name)-4s | %(message)s', datefmt=datefmt)
+    if getattr(constants, "LOG_JSON", False):
+        file_handler.setFormatter(JsonFormatter(datefmt=datefmt))
+    else:
+        file_handler.setFormatter(text_formatter)
+    stream_handler.setFormatter(text_formatter)
+
+    discord_filter = DiscordNameFilter()
+    file_handler.addFilter(discord_filter)
+    stream_handler.addFilter(discord_filter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = StructuredQueueHandler(log_queue)
+    queue_handler.addFilter(SuccessSampler(getattr(constants, "LOG_SUCCESS_SAMPLE", 1)))
+
+    _listener = QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.addHandler(queue_handler)
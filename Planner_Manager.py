@@ -0,0 +1,119 @@
+import time
+import logging
+import statistics
+from datetime import datetime, timedelta, timezone
+import Code_Manager
+
+DEFAULT_LATENCY = 0.5  # Seconds per API round trip until real latencies are measured
+HISTORY_CYCLES = 5     # Finished cycles averaged for the observed pace
+MEASURED_AFTER = 10    # Requests before a running cycle's ETA switches to its own pace
+
+def count_work(batches, passes, equivalence=None):
+    # (logins, pairs) for the planned passes: one login per player per pass with something pending,
+    # one redeem per (player, code) not already owned or covered by an equivalent code
+    logins = pairs = 0
+    for _, batch in batches:
+        for player, _ in batch:
+            for bits in passes:
+                pending = 0
+                for code, bit in bits:
+                    if player.redeemed & bit:
+                        continue
+                    if equivalence is not None and equivalence.satisfied_by(player, code):
+                        continue
+                    pending += 1
+                if pending:
+                    logins += 1
+                    pairs += pending
+    return logins, pairs
+
+class CycleProgress:
+    # Live progress of a running cycle, read by /next
+    def __init__(self, planned, seconds_per_request):
+        self.planned = planned
+        self.seconds_per_request = seconds_per_request
+        self.started = time.monotonic()
+        self.done = 0
+
+    def tick(self):
+        self.done += 1
+
+    def eta(self):
+        elapsed = time.monotonic() - self.started
+        pace = elapsed / self.done if self.done >= MEASURED_AFTER else self.seconds_per_request
+        remaining = max(self.planned - self.done, 0) * pace
+        return {
+            "done": self.done,
+            "planned": self.planned,
+            "elapsed_s": elapsed,
+            "remaining_s": remaining,
+            "finish_at": datetime.now(timezone.utc) + timedelta(seconds=remaining),
+        }
+
+class CyclePlanner:
+    # Cost model of a redemption cycle: which (fid, code) pairs are pending, how many logins and
+    # requests that takes, and how long at the current rate limits / observed pace.
+    def __init__(self, bot):
+        self.logger = logging.getLogger("MAIN")
+        self.bot = bot
+
+    def seconds_per_request(self):
+        # (seconds, source): the pace of recent cycles when known, otherwise the rate-limit model
+        history = self.bot.db.get_cycle_pace(HISTORY_CYCLES)
+        if history:
+            return statistics.median(history), "history"
+        latency = self.bot.api.scheduler.snapshot()["batch"]["latency_p50"] or DEFAULT_LATENCY
+        # Paced scheduler wait + request_delay sleep after every login/redeem + round trip
+        return self.bot.api.request_delay + self.bot.request_delay + latency, "model"
+
+    def split_passes(self, code_bits, deadlines, batches, equivalence=None):
+        # Codes expiring before the cycle could reach everyone get a first pass over all players
+        logins, pairs = count_work(batches, [code_bits], equivalence)
+        per_request, _ = self.seconds_per_request()
+        eta = datetime.now(timezone.utc) + timedelta(seconds=(logins + pairs) * per_request)
+        urgent = set(Code_Manager.urgent_codes([code for code, _ in code_bits], deadlines, eta))
+        passes = [[(code, bit) for code, bit in code_bits if code in urgent]] if urgent else []
+        passes.append([(code, bit) for code, bit in code_bits if code not in urgent])
+        return passes, urgent, eta
+
+    def plan(self, kingdoms=None, shard=None, refresh_codes=True):
+        # Dry run of the next cycle: no logins, no redemptions, no writes (besides the code feed)
+        bot = self.bot
+        if refresh_codes or bot.last_active_codes is None:
+            active_codes, deadlines = bot.fetch_active_codes()
+        else:
+            active_codes, deadlines = bot.last_active_codes
+        players = bot.db.get_indexed_players()
+        schedule = bot.db.get_player_schedule()
+        batches, skipped_tier = bot._due_batches(players, kingdoms, shard, schedule)
+
+        index = bot.db.index
+        code_bits = [(code, index.code_bit(code)) for code in active_codes]
+        equivalence = bot.equivalence
+        passes, urgent, _ = self.split_passes(code_bits, deadlines, batches, equivalence)
+        logins, pairs = count_work(batches, passes, equivalence)
+        per_code = {
+            code: sum(1 for _, batch in batches for player, _ in batch
+                      if not player.redeemed & bit and not equivalence.satisfied_by(player, code))
+            for code, bit in code_bits
+        }
+
+        per_request, source = self.seconds_per_request()
+        requests = logins + pairs
+        duration = requests * per_request
+        return {
+            "codes": active_codes,
+            "deadlines": deadlines,
+            "urgent": sorted(urgent),
+            "players_due": sum(len(batch) for _, batch in batches),
+            "players_skipped_tier": skipped_tier,
+            "kingdoms": len(batches),
+            "logins": logins,
+            "pairs": pairs,
+            "pending_by_code": per_code,
+            "requests": requests,
+            "seconds_per_request": per_request,
+            "pace_source": source,
+            "duration_s": duration,
+            "finish_at": datetime.now(timezone.utc) + timedelta(seconds=duration),
+        }
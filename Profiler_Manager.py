@@ -0,0 +1,140 @@
+import os
+import sys
+import time
+import logging
+import threading
+import tracemalloc
+from collections import Counter
+
+class SamplingProfiler:
+    # Samples Python stacks with sys._current_frames() from a daemon thread.
+    # thread_id: only sample that thread (cycle mode), None samples every other thread (window mode).
+    def __init__(self, interval=0.005, thread_id=None, max_seconds=None):
+        self.interval = interval
+        self.thread_id = thread_id
+        self.max_seconds = max_seconds
+        self.stacks = Counter()   # {"file:func;file:func": samples}
+        self.samples = 0
+        self.started = None
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        return self
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        own = threading.get_ident()
+        deadline = self.started + self.max_seconds if self.max_seconds else None
+        while not self._stop.is_set():
+            for tid, frame in sys._current_frames().items():
+                if tid == own or (self.thread_id is not None and tid != self.thread_id):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+            if deadline and time.perf_counter() >= deadline:
+                break
+            time.sleep(self.interval)
+        self.elapsed = time.perf_counter() - self.started
+
+    def folded(self):
+        # Brendan Gregg folded format, accepted by flamegraph.pl and speedscope
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def summary(self, top_n=15):
+        own_time = Counter()
+        total_time = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own_time[frames[-1]] += count
+            for name in set(frames):
+                total_time[name] += count
+
+        total = self.samples or 1
+        lines = [f"{self.samples} samples over {self.elapsed:.1f}s", "", "Top self time:"]
+        lines += [f"{count / total * 100:5.1f}%  {name}" for name, count in own_time.most_common(top_n)]
+        lines += ["", "Top total time:"]
+        lines += [f"{count / total * 100:5.1f}%  {name}" for name, count in total_time.most_common(top_n)]
+        return "\n".join(lines)
+
+class ProfileController:
+    # Owner-controlled profiling. KingshotBot only calls the cycle hooks while this is attached
+    # as bot.profiler, so nothing runs (or is checked beyond one attribute) while profiling is off.
+    def __init__(self):
+        self.logger = logging.getLogger("BOT")
+        self.profiler = None
+        self.mode = None      # "cycle" | "window"
+        self.result = None
+
+    def start_window(self, seconds):
+        self.mode = "window"
+        self.result = None
+        self.profiler = SamplingProfiler(max_seconds=seconds).start()
+        self.logger.info(f"Profiling window started ({seconds}s max).")
+
+    def arm_cycle(self):
+        self.mode = "cycle"
+        self.result = None
+        self.profiler = None
+        self.logger.info("Profiler armed for the next redemption cycle.")
+
+    def cycle_started(self):
+        if self.mode == "cycle" and self.profiler is None and self.result is None:
+            self.profiler = SamplingProfiler(thread_id=threading.get_ident()).start()
+            self.logger.info("Profiling redemption cycle...")
+
+    def cycle_finished(self):
+        if self.mode == "cycle" and self.profiler is not None:
+            self.result = self.profiler.stop()
+            self.profiler = None
+            self.logger.info("Redemption cycle profile ready.")
+
+    def stop(self):
+        # Returns the finished profile (or None if the armed cycle never ran)
+        if self.profiler is not None:
+            self.result = self.profiler.stop()
+            self.profiler = None
+        self.mode = None
+        return self.result
+
+class MemorySnapshots:
+    # tracemalloc is only started by the first take(), so it costs nothing until used
+    def __init__(self, frames=10):
+        self.frames = frames
+        self.previous = None
+
+    def take(self, top_n=15):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self.previous = tracemalloc.take_snapshot()
+            return "tracemalloc started, baseline snapshot taken. Run again to see growth."
+
+        snapshot = tracemalloc.take_snapshot()
+        stats = snapshot.compare_to(self.previous, "lineno")
+        self.previous = snapshot
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"Traced: {current / 1024 / 1024:.1f} MiB (peak {peak / 1024 / 1024:.1f} MiB)", "", "Top growth since last snapshot:"]
+        lines += [str(stat) for stat in stats[:top_n]]
+        return "\n".join(lines)
+
+    def stop(self):
+        self.previous = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
@@ -0,0 +1,56 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import constants
+
+class ProfileRefresher:
+    # Low-priority sweep that refreshes nickname/kid of the least recently updated players.
+    # Runs between cycles and yields to run_redemption_cycle as soon as one starts.
+    def __init__(self, bot):
+        self.logger = logging.getLogger("SYNC")
+        self.bot = bot
+        self.batch_size = getattr(constants, "PROFILE_REFRESH_BATCH", 20)
+        self.workers = getattr(constants, "PROFILE_REFRESH_WORKERS", 2)
+        self.limit = getattr(constants, "PROFILE_REFRESH_LIMIT", 200)  # Profiles per sweep
+
+    def _fetch(self, player):
+        with self.bot.api.scheduler.lane("background"):
+            profile = self.bot.api.get_player_info(player['fid'])
+        if profile:
+            self.bot.profiles.put(player['fid'], profile)
+            return (player['fid'], profile['nickname'], profile['kid'])
+        return None
+
+    def run_sweep(self, limit=None):
+        limit = limit or self.limit
+        players = self.bot.db.get_stale_profiles(limit)
+        if not players:
+            return 0
+
+        self.logger.info(f"--- Starting profile refresh for {len(players)} players...")
+        refreshed = 0
+        changed = 0
+        failed = 0
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="refresh") as pool:
+            for start in range(0, len(players), self.batch_size):
+                if self.bot.cycle_active.is_set():
+                    self.logger.info("Redemption cycle running. Pausing profile refresh...")
+                    self.bot.cycle_idle.wait()
+                    self.logger.info("Redemption cycle finished. Resuming profile refresh.")
+
+                batch = players[start:start + self.batch_size]
+                results = list(pool.map(self._fetch, batch))
+                profiles = [result for result in results if result]
+
+                changed += sum(
+                    1 for player, result in zip(batch, results)
+                    if result and (result[1] != player['nickname'] or result[2] != player['kid'])
+                )
+                refreshed += self.bot.db.bulk_update_player_info(profiles)
+                # Failed lookups only move to the back of the sweep, so one bad id can't pin its front.
+                # Writing the snapshot values back could overwrite a fresher name from the cycle or /find.
+                stale = [player['fid'] for player, result in zip(batch, results) if not result]
+                failed += self.bot.db.touch_profiles(stale)
+
+        self.logger.info(f"--- Profile refresh finished: {refreshed} refreshed, {changed} changed, {failed} failed.")
+        return refreshed
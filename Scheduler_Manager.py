@@ -0,0 +1,134 @@
+import time
+import heapq
+import itertools
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+# Priority classes, lower value is served first
+LANES = {"interactive": 0, "batch": 1, "background": 2}
+PACED_LANES = ("batch", "background")  # Keep their own request_delay sleep before queueing, as before
+
+class RequestScheduler:
+    # Central gate for every API request: at most one request per `min_interval` seconds across all threads.
+    # Waiting requests are granted by lane priority, so /find, /add and /redeem_for preempt a running cycle.
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self.condition = threading.Condition()
+        self.waiters = []            # heap of (priority, seq)
+        self.seq = itertools.count()
+        self.next_slot = 0.0
+        self.local = threading.local()
+        self.metrics = {lane: {"requests": 0, "wait": deque(maxlen=500), "latency": deque(maxlen=500)} for lane in LANES}
+
+    @contextmanager
+    def lane(self, name):
+        previous = getattr(self.local, "lane", "batch")
+        self.local.lane = name
+        try:
+            yield
+        finally:
+            self.local.lane = previous
+
+    def current_lane(self):
+        return getattr(self.local, "lane", "batch")
+
+    def wait(self):
+        lane = self.current_lane()
+        if lane in PACED_LANES:
+            time.sleep(self.min_interval)
+
+        started = time.perf_counter()
+        ticket = (LANES[lane], next(self.seq))
+        with self.condition:
+            heapq.heappush(self.waiters, ticket)
+            while True:
+                now = time.monotonic()
+                if self.waiters[0] == ticket and now >= self.next_slot:
+                    heapq.heappop(self.waiters)
+                    self.next_slot = now + self.min_interval
+                    self.condition.notify_all()
+                    break
+                timeout = self.next_slot - now if self.waiters[0] == ticket else None
+                self.condition.wait(timeout)
+
+        stats = self.metrics[lane]
+        stats["requests"] += 1
+        stats["wait"].append(time.perf_counter() - started)
+
+    def record_latency(self, latency):
+        self.metrics[self.current_lane()]["latency"].append(latency)
+
+    @staticmethod
+    def _percentile(samples, pct):
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+    def snapshot(self):
+        # {lane: {"requests", "wait_p50", "wait_p95", "latency_p50", "latency_p95"}} in seconds
+        report = {}
+        for lane, stats in self.metrics.items():
+            wait, latency = list(stats["wait"]), list(stats["latency"])
+            report[lane] = {
+                "requests": stats["requests"],
+                "wait_p50": self._percentile(wait, 0.5),
+                "wait_p95": self._percentile(wait, 0.95),
+                "latency_p50": self._percentile(latency, 0.5),
+                "latency_p95": self._percentile(latency, 0.95),
+            }
+        return report
+
+class FairShareQueue:
+    # Deficit round robin over flows (one flow per guild roster). Every turn a flow earns
+    # quantum * weight credits and is served while its head item's cost fits, so each guild gets its
+    # share of the cycle's requests no matter how many players the other guilds have.
+    def __init__(self, weights=None, quantum=4):
+        # A flow's deficit only grows with a positive weight; 0 would make pop() spin forever
+        for flow, weight in (weights or {}).items():
+            if not weight > 0:
+                raise ValueError(f"Fair-share weight for {flow} must be positive, got {weight!r}")
+        self.weights = weights or {}
+        self.quantum = quantum
+        self.queues = {}        # {flow: deque[(cost, item)]}
+        self.deficit = {}
+        self.active = deque()   # Flows with pending items, in round-robin order
+        self.credited = False   # Whether the head flow already got its quantum this turn
+
+    def push(self, flow, item, cost=1):
+        queue = self.queues.get(flow)
+        if queue is None:
+            queue = self.queues[flow] = deque()
+            self.deficit[flow] = 0
+        if not queue:
+            self.active.append(flow)
+        queue.append((cost, item))
+
+    def pop(self):
+        # Returns (flow, item)
+        while self.active:
+            flow = self.active[0]
+            if not self.credited:
+                self.deficit[flow] += self.quantum * self.weights.get(flow, 1)
+                self.credited = True
+            queue = self.queues[flow]
+            cost, item = queue[0]
+            if cost <= self.deficit[flow]:
+                queue.popleft()
+                self.deficit[flow] -= cost
+                if not queue:
+                    # An idle flow doesn't bank credit
+                    self.active.popleft()
+                    self.deficit[flow] = 0
+                    self.credited = False
+                return flow, item
+            self.active.rotate(-1)
+            self.credited = False
+        raise IndexError("pop from an empty FairShareQueue")
+
+    def __len__(self):
+        return sum(len(queue) for queue in self.queues.values())
+
+    def __bool__(self):
+        return bool(self.active)
@@ -0,0 +1,103 @@
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import constants
+from Code_Manager import normalize_record
+
+DEFAULT_TIMEOUT = 10  # Seconds per source
+DEFAULT_GRACE = 1.5   # Seconds the other sources get once the first one answered
+
+# --- FEED PARSERS ---
+# parser(response) -> [raw code entries (dicts with at least "code")]. Register new feed formats here.
+PARSERS = {}
+
+def register_parser(name):
+    def decorator(func):
+        PARSERS[name] = func
+        return func
+    return decorator
+
+@register_parser("kingshot_net")
+def parse_kingshot_net(response):
+    data = response.json()
+    if data.get("status") != "success":
+        raise ValueError("API status was not 'success'")
+    return data['data']['giftCodes']
+
+@register_parser("json_list")
+def parse_json_list(response):
+    # ["CODE", ...] or [{"code": "CODE", ...}, ...], optionally wrapped in {"codes": [...]}
+    data = response.json()
+    if isinstance(data, dict):
+        data = data.get("codes", data.get("data", []))
+    return [item if isinstance(item, dict) else {"code": str(item)} for item in data]
+
+@register_parser("text")
+def parse_text(response):
+    # One code per line, '#' comments
+    lines = (line.split("#", 1)[0].strip() for line in response.text.splitlines())
+    return [{"code": line} for line in lines if line]
+
+def configured_sources():
+    # CODE_SOURCES: [{"name", "url", "format", "timeout"}]; defaults to the single kingshot.net feed
+    sources = getattr(constants, "CODE_SOURCES", None)
+    if not sources:
+        sources = [{"name": "kingshot.net", "url": constants.ACTIVE_CODES_URL, "format": "kingshot_net"}]
+    return sources
+
+class CodeDiscovery:
+    # Fetches every configured source in parallel and merges their codes with provenance.
+    # Returns as soon as one source answered plus a short grace period for the others, so discovery
+    # costs the fastest source's latency; sources still running after that are left out of this round.
+    def __init__(self, send, sources=None, grace=None):
+        self.logger = logging.getLogger("API")
+        self.send = send  # KingshotAPI._send (traced, shared transport)
+        self.sources = sources if sources is not None else configured_sources()
+        self.grace = grace if grace is not None else getattr(constants, "CODE_SOURCE_GRACE", DEFAULT_GRACE)
+        self.pool = ThreadPoolExecutor(max_workers=max(1, len(self.sources)), thread_name_prefix="codesrc")
+
+    def _fetch(self, source):
+        started = time.perf_counter()
+        response = self.send(source['url'], timeout=source.get("timeout", DEFAULT_TIMEOUT))
+        response.raise_for_status()
+        items = PARSERS[source.get("format", "kingshot_net")](response)
+        return items, time.perf_counter() - started
+
+    def discover(self):
+        # [{"code", "created_at", "expires_at", "raw", "sources"}] in source priority order, [] if every source failed
+        futures = {self.pool.submit(self._fetch, source): source for source in self.sources}
+        results = {}
+        pending = set(futures)
+        deadline = None
+        while pending:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                source = futures[future]
+                try:
+                    items, latency = future.result()
+                except Exception as e:
+                    self.logger.warning(f"Code source {source['name']} failed: {e}")
+                    continue
+                results[source['name']] = items
+                self.logger.info(f"Code source {source['name']}: {len(items)} codes in {latency * 1000:.0f} ms")
+                if deadline is None:
+                    deadline = time.monotonic() + self.grace
+        for future in pending:
+            self.logger.warning(f"Code source {futures[future]['name']} too slow, skipped this round.")
+
+        merged = {}
+        for source in self.sources:  # Config order = priority for conflicting metadata
+            for item in results.get(source['name'], ()):
+                record = normalize_record(item)
+                known = merged.get(record['code'])
+                if known is None:
+                    record['sources'] = [source['name']]
+                    merged[record['code']] = record
+                else:
+                    known['sources'].append(source['name'])
+                    known['created_at'] = known['created_at'] or record['created_at']
+                    known['expires_at'] = known['expires_at'] or record['expires_at']
+        return list(merged.values())
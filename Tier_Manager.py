@@ -0,0 +1,38 @@
+import constants
+
+# Activity tiers stored per player (players.tier).
+# every_days: minimum days between cycle attempts (0 = every cycle)
+# attempts: retry budget per cycle (login/error attempts before the player is dropped)
+TIER_POLICY = getattr(constants, "TIER_POLICY", {
+    "hot":     {"every_days": 0,  "attempts": 3},
+    "normal":  {"every_days": 0,  "attempts": 3},
+    "dormant": {"every_days": 7,  "attempts": 2},
+    "broken":  {"every_days": 14, "attempts": 1},
+})
+TIER_ORDER = {"hot": 0, "normal": 1, "dormant": 2, "broken": 3}  # Processing order inside a batch
+
+DORMANT_AFTER = 5  # Consecutive attempted cycles without claiming anything
+BROKEN_AFTER = 3   # Consecutive cycles dropped for failed logins
+
+def policy(tier):
+    return TIER_POLICY.get(tier, TIER_POLICY["normal"])
+
+def is_due(tier, days_since_attempt):
+    if days_since_attempt is None:
+        return True
+    return days_since_attempt >= policy(tier)["every_days"]
+
+def next_state(tier, fail_streak, idle_streak, outcome):
+    # outcome: "success" (claimed a code), "idle" (logged in, nothing claimed),
+    # "login_failed" (dropped after failed logins), "error" (transient, no change)
+    if outcome == "success":
+        return "hot", 0, 0
+    if outcome == "login_failed":
+        fail_streak += 1
+        return ("broken" if fail_streak >= BROKEN_AFTER else tier), fail_streak, idle_streak
+    if outcome == "idle":
+        idle_streak += 1
+        if idle_streak >= DORMANT_AFTER:
+            return "dormant", 0, idle_streak
+        return ("normal" if tier in ("hot", "broken") else tier), 0, idle_streak
+    return tier, fail_streak, idle_streak
@@ -0,0 +1,143 @@
+import json
+import time
+import logging
+import threading
+from collections import defaultdict, deque, Counter
+from urllib.parse import parse_qs
+import requests
+import constants
+
+# One JSON object per line:
+# {"t": offset_s, "ep": "player"|"redeem"|"codes", "fid", "cdk", "status", "err", "lat": latency_s, "body": {...}}
+# Failed requests carry "error" instead of "status"/"body". Code-feed ("codes") entries also carry the
+# source "url" and the raw body "text", so several sources and non-JSON formats replay faithfully.
+
+def endpoint_for(url):
+    if url == constants.PLAYER_URL:
+        return "player"
+    if url == constants.REDEEM_URL:
+        return "redeem"
+    return "codes"
+
+class TraceRecorder:
+    def __init__(self, path):
+        self.logger = logging.getLogger("API")
+        self.path = path
+        self.file = open(path, "a", encoding="utf-8")
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.logger.info(f"Recording API trace to {path}")
+
+    def record(self, endpoint, fid, cdk, started, latency, response=None, error=None, url=None):
+        entry = {"t": round(started - self.started, 4), "ep": endpoint, "fid": fid, "cdk": cdk, "lat": round(latency, 4)}
+        if endpoint == "codes":
+            entry["url"] = url
+        if error is not None:
+            entry["error"] = error
+        else:
+            entry["status"] = response.status_code
+            try:
+                body = response.json()
+            except ValueError:
+                body = None
+            entry["body"] = body
+            entry["err"] = body.get("err_code") if isinstance(body, dict) else None
+            if endpoint == "codes":
+                entry["text"] = response.text
+        line = json.dumps(entry, separators=(",", ":"), ensure_ascii=False)
+        with self.lock:
+            self.file.write(line + "\n")
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+class ReplayResponse:
+    def __init__(self, url, status_code, body, text=None):
+        self.url = url
+        self.status_code = status_code
+        self._body = body
+        self._text = text
+
+    @property
+    def text(self):
+        if self._text is not None:
+            return self._text
+        return "" if self._body is None else json.dumps(self._body)
+
+    def json(self):
+        if self._body is None:
+            raise ValueError("Recorded response had no JSON body")
+        return self._body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error (replayed) for url: {self.url}", response=self)
+
+class ReplayTransport:
+    # Session-like transport (post/get) that answers from a recorded trace.
+    # speed: 1.0 replays original latencies, 0.5 half of them, 0 replays instantly.
+    def __init__(self, path, speed=1.0):
+        self.logger = logging.getLogger("API")
+        self.speed = speed
+        self.lock = threading.Lock()
+        self.exact = defaultdict(deque)     # {(endpoint, fid, cdk): entries}
+        self.by_endpoint = defaultdict(deque)
+        self.feeds = defaultdict(deque)     # {url: code-feed entries}
+        self.requests = Counter()           # {endpoint: replayed requests}
+        self.misses = Counter()             # {endpoint: requests with no recorded answer}
+
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                key = (entry["ep"], self._norm(entry.get("fid")), entry.get("cdk"))
+                self.exact[key].append(entry)
+                self.by_endpoint[entry["ep"]].append(entry)
+                if entry.get("url"):
+                    self.feeds[entry["url"]].append(entry)
+        self.logger.info(f"Loaded trace {path}: {sum(len(q) for q in self.by_endpoint.values())} requests.")
+
+    @staticmethod
+    def _norm(fid):
+        return None if fid is None else str(fid)
+
+    def _next_entry(self, endpoint, fid, cdk, url=None):
+        with self.lock:
+            self.requests[endpoint] += 1
+            if endpoint == "codes" and self.feeds:
+                # Each source only ever gets its own recorded bodies
+                queue = self.feeds.get(url)
+            else:
+                # Traces recorded before code-feed entries carried their url
+                queue = self.exact.get((endpoint, self._norm(fid), cdk))
+            if queue:
+                entry = queue.popleft()
+                # Rotate so repeated identical requests (re-logins, retries) keep getting answers
+                queue.append(entry)
+                return entry
+            if endpoint == "codes" and not self.feeds and self.by_endpoint["codes"]:
+                return self.by_endpoint["codes"][-1]
+            self.misses[endpoint] += 1
+            return None
+
+    def _answer(self, url, endpoint, fid=None, cdk=None):
+        entry = self._next_entry(endpoint, fid, cdk, url)
+        if entry is None:
+            return ReplayResponse(url, 200, {"code": 1, "msg": "Not in trace", "err_code": None})
+        if self.speed:
+            time.sleep(entry.get("lat", 0) * self.speed)
+        if "error" in entry:
+            raise requests.exceptions.ConnectionError(f"Replayed error: {entry['error']}")
+        return ReplayResponse(url, entry.get("status", 200), entry.get("body"), entry.get("text"))
+
+    def post(self, url, data=None, timeout=None):
+        fields = parse_qs(data.decode("ascii") if isinstance(data, bytes) else (data or ""), keep_blank_values=True)
+        fid = fields.get("fid", [None])[0]
+        cdk = fields.get("cdk", [None])[0]
+        return self._answer(url, endpoint_for(url), fid, cdk)
+
+    def get(self, url, timeout=None):
+        return self._answer(url, endpoint_for(url))
@@ -0,0 +1,75 @@
+# Memory/lookup benchmark: sqlite3.Row roster + DB probes vs the slotted PlayerIndex.
+# Seeds a throwaway database, so it never touches the real kingshot.db.
+# Load times are taken under tracemalloc, so compare them relative to each other only.
+# Usage (from the repo root, with constants.py present): python benchmarks/bench_player_index.py [players] [codes]
+import os
+import sys
+import time
+import random
+import tempfile
+import tracemalloc
+import logging
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import constants
+
+def seed(db, players, codes):
+    rnd = random.Random(7)
+    nicknames = [f"lord{i}" for i in range(players // 4 or 1)]  # Shared nicknames are common
+    code_list = [f"CODE{i:03d}" for i in range(codes)]
+    db.conn.executemany(
+        "INSERT INTO players (fid, nickname, kid) VALUES (?, ?, ?)",
+        ((100_000_000 + i, rnd.choice(nicknames), rnd.randint(1, 400)) for i in range(players))
+    )
+    db.conn.executemany(
+        "INSERT INTO redemptions (fid, code) VALUES (?, ?)",
+        ((100_000_000 + i, code) for i in range(players) for code in code_list if rnd.random() < 0.6)
+    )
+    db.conn.commit()
+    return code_list
+
+def measure(label, build):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} current {current / 1024 / 1024:8.1f} MiB | peak {peak / 1024 / 1024:8.1f} MiB | load {elapsed:6.2f}s")
+    return result
+
+def probe(label, players, codes, is_redeemed):
+    start = time.perf_counter()
+    hits = 0
+    for p in players:
+        for code in codes:
+            hits += is_redeemed(p, code)
+    elapsed = time.perf_counter() - start
+    lookups = len(players) * len(codes)
+    print(f"{label:<28} {lookups / elapsed:>12,.0f} lookups/s ({hits} redeemed)")
+
+if __name__ == "__main__":
+    logging.disable(logging.INFO)
+    n_players = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    n_codes = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+
+    with tempfile.TemporaryDirectory() as tmp:
+        constants.DB_NAME = os.path.join(tmp, "bench.db")
+        from Database_Manager import DatabaseManager
+        db = DatabaseManager()
+        codes = seed(db, n_players, n_codes)
+        print(f"Seeded {n_players:,} players x {n_codes} codes")
+
+        rows = measure("Row roster (current)", lambda: deque([(p, 0) for p in db.show_all_players()]))
+        index = measure("PlayerIndex (slotted)", db.load_index)
+
+        sample_rows = [p for p, _ in list(rows)[:5000]]
+        sample_records = index.all_players()[:5000]
+        db.index = None
+        probe("DB is_code_redeemed", sample_rows, codes, lambda p, c: db.is_code_redeemed(p['fid'], c))
+        db.index = index
+        bits = [index.code_bit(c) for c in codes]
+        probe("Index bitmask", sample_records, bits, lambda p, bit: bool(p.redeemed & bit))
+        db.close()
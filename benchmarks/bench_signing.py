@@ -0,0 +1,77 @@
+# Microbenchmark: request signing + form serialization throughput.
+# Compares the legacy dict/sort/f-string path with RequestBuilder and checks
+# that both produce the exact same bytes.
+# Usage (from the repo root, with constants.py present): python benchmarks/bench_signing.py
+import os
+import sys
+import time
+import random
+import string
+import hashlib
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from API_Manager import RequestBuilder
+import constants
+
+ITERATIONS = 200_000
+
+# Legacy reference implementation (formerly KingshotAPI._generate_sign)
+def legacy_sign(params):
+    sorted_keys = sorted(params.keys())
+    raw_string = "&".join([f"{k}={params[k]}" for k in sorted_keys])
+    raw_string += constants.SALT
+    return hashlib.md5(raw_string.encode("utf-8")).hexdigest()
+
+def legacy_player(fid, current_time):
+    params = {"fid": fid, "time": current_time}
+    payload = params.copy()
+    payload['sign'] = legacy_sign(params)
+    return urlencode(payload).encode("ascii")
+
+def legacy_redeem(fid, cdk, current_time):
+    params = {"captcha_code": "", "cdk": cdk, "fid": fid, "time": current_time}
+    payload = params.copy()
+    payload['sign'] = legacy_sign(params)
+    return urlencode(payload).encode("ascii")
+
+def make_inputs(count):
+    rnd = random.Random(42)
+    inputs = []
+    for i in range(count):
+        fid = rnd.choice([str(rnd.randint(1_000_000, 999_999_999)), rnd.randint(1_000_000, 999_999_999)])
+        cdk = "".join(rnd.choices(string.ascii_uppercase + string.digits, k=rnd.randint(6, 14)))
+        current_time = str(1_700_000_000_000 + i)
+        inputs.append((fid, cdk, current_time))
+    # Odd inputs that need escaping
+    inputs.append(("123 456", "SPRING FEST&2026", "1700000000000"))
+    inputs.append(("226431996", "ÉTÉ2026", "1700000000001"))
+    return inputs
+
+def verify(builder, inputs):
+    for fid, cdk, current_time in inputs:
+        assert legacy_player(fid, current_time) == builder.player_body(fid, current_time), (fid, current_time)
+        assert legacy_redeem(fid, cdk, current_time) == builder.redeem_body(fid, cdk, current_time), (fid, cdk)
+    print(f"Verified {len(inputs)} inputs: bodies match byte for byte.")
+
+def bench(label, func, inputs):
+    start = time.perf_counter()
+    for fid, cdk, current_time in inputs:
+        func(fid, cdk, current_time)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<22} {len(inputs) / elapsed:>12,.0f} req/s  ({elapsed * 1e6 / len(inputs):.2f} us/req)")
+    return elapsed
+
+if __name__ == "__main__":
+    builder = RequestBuilder(constants.SALT)
+    inputs = make_inputs(ITERATIONS)
+
+    verify(builder, inputs[:5000] + inputs[-2:])
+
+    old_p = bench("legacy player", lambda f, c, t: legacy_player(f, t), inputs)
+    new_p = bench("builder player", lambda f, c, t: builder.player_body(f, t), inputs)
+    old_r = bench("legacy redeem", lambda f, c, t: legacy_redeem(f, c, t), inputs)
+    new_r = bench("builder redeem", lambda f, c, t: builder.redeem_body(f, c, t), inputs)
+
+    print(f"Speedup: player x{old_p / new_p:.2f}, redeem x{old_r / new_r:.2f}")
@@ -0,0 +1,57 @@
+# Cold-start benchmark for the bot and the CLI entry modules.
+# Runs each import in a fresh interpreter with `python -X importtime` and reports the
+# median wall time plus the heaviest imports.
+# Usage (from the repo root, with constants.py present): python benchmarks/bench_startup.py [runs]
+import os
+import re
+import sys
+import time
+import statistics
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = {
+    "cli (import main)": "import main",
+    "cli + bot container": "import main; main.KingshotBot()",
+    "db only": "import Database_Manager",
+    "bot (import Discord_Manager)": "import Discord_Manager",
+}
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+def run_importtime(code):
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=REPO_ROOT, capture_output=True, text=True, env=os.environ.copy()
+    )
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+
+    modules = []
+    for line in proc.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            cumulative_us = int(match.group(2))
+            depth = len(match.group(3)) // 2
+            modules.append((cumulative_us, depth, match.group(4)))
+    return elapsed, modules
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    for label, code in TARGETS.items():
+        timings = []
+        modules = []
+        for _ in range(runs):
+            elapsed, modules = run_importtime(code)
+            timings.append(elapsed)
+
+        top_level = sorted((m for m in modules if m[1] == 0), reverse=True)[:6]
+        imported = {name.split(".")[0] for _, _, name in modules}
+        print(f"{label:<30} median {statistics.median(timings) * 1000:7.1f} ms over {runs} runs")
+        print(f"    requests loaded: {'requests' in imported} | discord loaded: {'discord' in imported}")
+        for cumulative_us, _, name in top_level:
+            print(f"    {cumulative_us / 1000:8.1f} ms  {name}")
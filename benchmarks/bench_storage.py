@@ -0,0 +1,110 @@
+# Storage profile benchmark: the real DatabaseManager query mix under each STORAGE_PROFILES entry.
+# For every size (redemption rows) and profile it seeds a fresh database, then times DB-side
+# is_code_redeemed (index disabled), committed log_successful_redemption calls, check_codes_redeemed
+# and the /stats query set. Run it with --dir on the same filesystem as the bot's volume: on tmpfs
+# fsync is free and the synchronous/journal settings look identical.
+# Usage (from the repo root, with constants.py present):
+#   python benchmarks/bench_storage.py [--sizes 10000,100000,1000000] [--profiles default,balanced] [--dir /app/data]
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import constants
+
+CODES = 40   # Codes seen over the bot's lifetime
+DENSITY = 0.5  # Share of (player, code) pairs redeemed
+GUILDS = 20
+
+def seed(db, rows):
+    rnd = random.Random(11)
+    players = max(rows // int(CODES * DENSITY), 1)
+    fids = [100_000_000 + i for i in range(players)]
+    codes = [f"CODE{i:03d}" for i in range(CODES)]
+    db.conn.executemany(
+        "INSERT INTO players (fid, nickname, kid) VALUES (?, ?, ?)",
+        ((fid, f"lord{fid % 5000}", rnd.randint(1, 400)) for fid in fids)
+    )
+    db.conn.executemany(
+        "INSERT INTO player_guilds (guild_id, fid) VALUES (?, ?)",
+        ((1 + fid % GUILDS, fid) for fid in fids)
+    )
+    pairs = ((fid, code) for fid in fids for code in codes)
+    db.conn.executemany(
+        "INSERT INTO redemptions (fid, code, redeemed_at) VALUES (?, ?, datetime('now', ?))",
+        ((fid, code, f"-{rnd.randint(0, 60 * 24)} hours") for fid, code in pairs if rnd.random() < DENSITY)
+    )
+    db.conn.commit()
+    db.optimize(analyze=True)
+    return fids, codes
+
+def timed(ops, func):
+    start = time.perf_counter()
+    for args in ops:
+        func(*args)
+    return len(ops) / (time.perf_counter() - start)
+
+def stats_queries(db):
+    # What /stats and the cycle report read
+    db.get_player_count()
+    db.get_kingdom_count()
+    db.get_redeemed_codes()
+    db.get_servers_stats()
+    db.get_guild_stats(1)
+    db.get_latest_redemption_info()
+    db.get_storage_stats()
+
+def run(profile, rows, ops, directory):
+    path = os.path.join(directory, f"bench_{profile}_{rows}.db")
+    constants.DB_NAME = path
+    constants.DB_PROFILE = profile
+    constants.DB_PRAGMAS = {}
+    from Database_Manager import DatabaseManager
+
+    db = DatabaseManager()
+    start = time.perf_counter()
+    fids, codes = seed(db, rows)
+    seeded = time.perf_counter() - start
+    db.index = None  # Measure SQLite, not the in-memory index
+
+    rnd = random.Random(5)
+    lookups = [(rnd.choice(fids), rnd.choice(codes)) for _ in range(ops)]
+    writes = [(rnd.choice(fids), f"NEW{i:05d}", {"code": 0}) for i in range(ops // 4)]
+    result = {
+        "seed_s": seeded,
+        "lookup": timed(lookups, db.is_code_redeemed),
+        "log": timed(writes, db.log_successful_redemption),
+        "history": timed([(fid,) for fid, _ in lookups[:ops // 4]], db.check_codes_redeemed),
+        "stats": timed([(db,)] * 20, stats_queries),
+        "size_mib": os.path.getsize(path) / 1024 / 1024,
+    }
+    db.close()
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    return result
+
+if __name__ == "__main__":
+    from Database_Manager import STORAGE_PROFILES
+
+    parser = argparse.ArgumentParser(description="Benchmark the SQLite storage profiles")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Redemption row counts")
+    parser.add_argument("--profiles", default=",".join(STORAGE_PROFILES))
+    parser.add_argument("--ops", type=int, default=4000, help="Lookups per size (writes and history use a quarter)")
+    parser.add_argument("--dir", help="Directory for the throwaway databases (default: a temp dir)")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        for rows in (int(size) for size in args.sizes.split(",")):
+            print(f"\n{rows:,} redemptions")
+            print(f"{'profile':<10} {'seed s':>8} {'lookup/s':>10} {'log/s':>9} {'history/s':>10} {'stats/s':>8} {'MiB':>7}")
+            for profile in args.profiles.split(","):
+                r = run(profile, rows, args.ops, tmp)
+                print(f"{profile:<10} {r['seed_s']:>8.2f} {r['lookup']:>10,.0f} {r['log']:>9,.0f} "
+                      f"{r['history']:>10,.0f} {r['stats']:>8.1f} {r['size_mib']:>7.1f}")
@@ -0,0 +1,212 @@
+# Load test for the Discord command layer.
+# Drives the slash-command coroutines with fake interactions at a given concurrency, against a
+# seeded throwaway SQLite DB and a local mock of the game API, and reports per-command latency
+# percentiles plus how long the event loop was blocked.
+# Usage (from the repo root, with constants.py present):
+#   python benchmarks/load_discord.py [--players 5000] [--requests 200] [--concurrency 20]
+#                                     [--api-latency 0.05] [--request-delay 0]
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+import statistics
+from urllib.parse import parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import constants
+
+SEEDED_FID = 100_000_000
+NEW_FID = 900_000_000
+CODES = ["SPRING2026", "KINGSTORE", "LOVEKS", "RAMADAN"]
+
+# --- MOCK GAME API ---
+
+class MockResponse:
+    def __init__(self, body):
+        self.status_code = 200
+        self.body = body
+
+    def json(self):
+        return self.body
+
+    def raise_for_status(self):
+        pass
+
+class MockTransport:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def get(self, url, timeout=None):
+        time.sleep(self.latency)
+        return MockResponse({"status": "success", "data": {"giftCodes": [{"code": c} for c in CODES]}})
+
+    def post(self, url, data=None, timeout=None):
+        time.sleep(self.latency)
+        fields = parse_qs(data.decode("ascii"), keep_blank_values=True)
+        fid = int(fields["fid"][0])
+        if "cdk" in fields:
+            return MockResponse({"code": 0, "err_code": 20000, "msg": "SUCCESS"})
+        return MockResponse({"code": 0, "data": {
+            "fid": fid, "nickname": f"lord{fid}", "kid": fid % 300, "stove_lv_content": 30, "avatar_image": ""
+        }})
+
+# --- FAKE DISCORD OBJECTS ---
+
+class FakeMessage:
+    async def edit(self, **kwargs):
+        pass
+
+class FakeResponse:
+    def __init__(self):
+        self.done = False
+
+    def is_done(self):
+        return self.done
+
+    async def defer(self, **kwargs):
+        self.done = True
+
+    async def send_message(self, *args, **kwargs):
+        self.done = True
+
+    async def edit_message(self, **kwargs):
+        self.done = True
+
+class FakeFollowup:
+    async def send(self, *args, view=None, **kwargs):
+        if view is not None and hasattr(view, "value"):
+            # Auto-confirm ConfirmView dialogs
+            view.value = True
+            view.stop()
+        return FakeMessage()
+
+class FakeUser:
+    id = 1
+
+class FakeInteraction:
+    def __init__(self, client):
+        self.client = client
+        self.user = FakeUser()
+        self.guild_id = 1
+        self.channel_id = 1
+        self.response = FakeResponse()
+        self.followup = FakeFollowup()
+
+# --- HARNESS ---
+
+def seed(db, players):
+    rnd = random.Random(3)
+    db.conn.executemany(
+        "INSERT INTO players (fid, nickname, kid) VALUES (?, ?, ?)",
+        ((SEEDED_FID + i, f"lord{i}", rnd.randint(1, 300)) for i in range(players))
+    )
+    # Skewed rosters: guild 1 (the fake interactions' guild) is small, guild 2 holds most players
+    db.conn.executemany(
+        "INSERT INTO player_guilds (guild_id, fid) VALUES (?, ?)",
+        ((1 if i % 50 == 0 else 2, SEEDED_FID + i) for i in range(players))
+    )
+    db.conn.executemany(
+        "INSERT INTO redemptions (fid, code) VALUES (?, ?)",
+        ((SEEDED_FID + i, c) for i in range(players) for c in CODES[:2] if rnd.random() < 0.7)
+    )
+    db.conn.commit()
+    db.load_index()
+
+def build_scenarios(dm, players):
+    new_fids = iter(range(NEW_FID, NEW_FID + 10_000_000))
+
+    def seeded():
+        return str(SEEDED_FID + random.randrange(players))
+
+    return {
+        "find": lambda i: dm.find.callback(i, fid=seeded()),
+        "add": lambda i: dm.add.callback(i, fid=str(next(new_fids))),
+        "stats": lambda i: dm.stats.callback(i),
+        "history": lambda i: dm.history.callback(i, fid=seeded()),
+        "redeem_for": lambda i: dm.redeem_for.callback(i, fid=seeded()),
+        "list_players": lambda i: dm.list_registered_players.callback(i),
+    }
+
+async def monitor_loop(stop, interval, lags):
+    # Measures how late the loop wakes up: any lag is time the loop was blocked
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+async def run_load(dm, scenarios, total, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = {name: [] for name in scenarios}
+    errors = {name: 0 for name in scenarios}
+    names = list(scenarios)
+
+    async def one(k):
+        name = names[k % len(names)]
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await scenarios[name](FakeInteraction(dm.bot))
+            except Exception as e:
+                errors[name] += 1
+                logging.getLogger("BOT").error(f"{name} failed: {e}")
+            latencies[name].append(time.perf_counter() - start)
+
+    lags = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_loop(stop, 0.005, lags))
+    start = time.perf_counter()
+    await asyncio.gather(*(one(k) for k in range(total)))
+    wall = time.perf_counter() - start
+    stop.set()
+    await monitor
+    return latencies, errors, lags, wall
+
+def pct(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+def report(latencies, errors, lags, wall):
+    print(f"\n{'command':<14} {'n':>5} {'err':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, samples in latencies.items():
+        if samples:
+            print(f"{name:<14} {len(samples):>5} {errors[name]:>4} "
+                  f"{pct(samples, .5) * 1000:9.1f} {pct(samples, .95) * 1000:9.1f} {pct(samples, .99) * 1000:9.1f}")
+    blocked = sum(lag for lag in lags if lag > 0.005)
+    print(f"\nWall time: {wall:.2f}s")
+    if lags:
+        print(f"Event loop lag: p50 {statistics.median(lags) * 1000:.1f} ms | p99 {pct(lags, .99) * 1000:.1f} ms | "
+              f"max {max(lags) * 1000:.1f} ms | blocked {blocked:.2f}s ({blocked / wall * 100:.0f}% of wall time)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the Discord slash-command layer.")
+    parser.add_argument("--players", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=200, help="Total command invocations (round-robin over commands)")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--api-latency", type=float, default=0.05, help="Mock API latency per request (s)")
+    parser.add_argument("--request-delay", type=float, default=0.0, help="API rate gate interval (production: 5)")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        constants.DB_NAME = os.path.join(tmp, "load.db")
+        constants.TRACE_FILE = None
+
+        import Discord_Manager as dm
+        from API_Manager import KingshotAPI
+
+        dm.ks_bot.api = KingshotAPI(transport=MockTransport(args.api_latency))
+        dm.ks_bot.api.request_delay = args.request_delay
+        dm.ks_bot.request_delay = args.request_delay
+        seed(dm.ks_bot.db, args.players)
+
+        scenarios = build_scenarios(dm, args.players)
+        print(f"Seeded {args.players} players | {args.requests} commands at concurrency {args.concurrency}")
+        latencies, errors, lags, wall = asyncio.run(run_load(dm, scenarios, args.requests, args.concurrency))
+        report(latencies, errors, lags, wall)
+        dm.ks_bot.db.close()
@@ -0,0 +1,84 @@
+# Replays a recorded API trace (constants.TRACE_FILE) through a full redemption cycle, offline.
+# Runs against a copy of a DB snapshot and reports wall time, requests per endpoint and DB writes,
+# so two engine versions can be compared on the exact same production cycle.
+# Usage (from the repo root, with constants.py present):
+#   python benchmarks/replay_cycle.py trace.jsonl --db kingshot-snapshot.db [--speed 0] [--delay-scale 0]
+#                                     [--out result.json] [--compare previous.json]
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import constants
+
+def replay(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        constants.DB_NAME = os.path.join(tmp, "replay.db")
+        if args.db:
+            shutil.copyfile(args.db, constants.DB_NAME)
+        constants.TRACE_FILE = None  # Never re-record while replaying
+
+        import main
+        from API_Manager import KingshotAPI
+        from Trace_Manager import ReplayTransport
+
+        bot = main.KingshotBot()
+        transport = ReplayTransport(args.trace, speed=args.speed)
+        bot.api = KingshotAPI(transport=transport)
+        # Engine-side pacing is policy, not network time: scale it separately
+        bot.api.request_delay *= args.delay_scale
+        bot.request_delay *= args.delay_scale
+        bot.pause_duration *= args.delay_scale
+
+        changes_before = bot.db.conn.total_changes
+        start = time.perf_counter()
+        stats = bot.run_redemption_cycle()
+        wall = time.perf_counter() - start
+
+        result = {
+            "wall_s": round(wall, 3),
+            "requests": dict(transport.requests),
+            "total_requests": sum(transport.requests.values()),
+            "misses": dict(transport.misses),
+            "db_writes": bot.db.conn.total_changes - changes_before,
+            "stats": {k: v for k, v in (stats or {}).items() if k != "distribution"},
+        }
+        bot.db.close()
+        return result
+
+def compare(current, previous):
+    print("\nComparison (previous -> current):")
+    for key in ("wall_s", "total_requests", "db_writes"):
+        old, new = previous.get(key, 0), current.get(key, 0)
+        delta = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+        print(f"  {key:<16} {old:>10} -> {new:<10} ({delta})")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a recorded API trace through a redemption cycle.")
+    parser.add_argument("trace")
+    parser.add_argument("--db", help="DB snapshot taken when the trace was recorded (copied, never modified)")
+    parser.add_argument("--speed", type=float, default=0.0, help="Latency scale: 1 = original, 0 = instant")
+    parser.add_argument("--delay-scale", type=float, default=0.0, help="Scale for request_delay/pause sleeps")
+    parser.add_argument("--out", help="Write the result as JSON")
+    parser.add_argument("--compare", help="Previous result JSON to compare against")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.WARNING)
+
+    result = replay(args)
+    print(json.dumps(result, indent=2))
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(result, json.load(f))
@@ -1,59 +1,193 @@
 import sys
 import time
 import logging
-from logging.handlers import RotatingFileHandler
 import random
-from collections import defaultdict, deque, Counter
+import threading
+from functools import cached_property
+from collections import defaultdict, Counter
 from datetime import datetime, timedelta
-from API_Manager import KingshotAPI
-from Database_Manager import DatabaseManager
 import constants
-
-# --- LOGGING SETUP ---
-class DiscordNameFilter(logging.Filter):
-    def filter(self, record):
-        if record.name.startswith("discord"):
-            record.name = "BOT"
-        return True
-    
-logging.Formatter.converter = time.gmtime
-
-file_handler = RotatingFileHandler(
-    constants.LOG_FILE, 
-    maxBytes= 5*1024*1024, # 5 MB per file
-    backupCount=3,        # Keep 3 old log files (15MB total max)
-    encoding='utf-8'
-)
-
-stream_handler = logging.StreamHandler(sys.stdout)
-
-discord_filter = DiscordNameFilter()
-file_handler.addFilter(discord_filter)
-stream_handler.addFilter(discord_filter)
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s | %(levelname)-8s | %(name)-4s | %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S',
-    handlers=[file_handler, stream_handler]
-)
+import Tier_Manager
+import Code_Manager
+from Scheduler_Manager import FairShareQueue
+from Planner_Manager import CycleProgress, count_work
+from Log_Manager import setup_logging
 
 logger = logging.getLogger("MAIN")
 
 # --- MAIN BOT CLASS ---
 class KingshotBot:
+    # Components (API session, DB connection + index) are created on first use,
+    # so constructing the bot, importing this module or running DB-only tools stays cheap.
     def __init__(self):
-        self.api = KingshotAPI()
-        self.db = DatabaseManager()
         self.error_threshold = 5   # Pause after 5 consecutive unknown errors
         self.pause_duration = 180  # Pause for 3 minutes (180s)
         self.request_delay = 5     # Wait 5s between requests to be safe
-
-    def redeem_for_player(self, fid):
+        self.kingdom_priority = getattr(constants, "KINGDOM_PRIORITY", [])  # Kingdoms processed first, in order
+        self.kingdom_ineligible_threshold = 3  # 40006/40017 responses before a code is skipped for a whole kingdom
+        self.equivalence_threshold = 3  # Distinct players whose 40011 points at the same code before two codes are linked
+        self.equivalence_probes = 3     # Owners of a linked partner still sent the code, so a success can undo the link
+        self.equivalence_max_age = 72   # Hours before a learned link expires and has to be learned again
+        self.guild_weights = self._valid_weights(getattr(constants, "GUILD_WEIGHTS", {}))  # {guild_id: weight} for fair-share scheduling, default 1
+        self.cycle_active = threading.Event()  # Set while a redemption cycle runs (background work yields)
+        self.cycle_idle = threading.Event()
+        self.cycle_idle.set()
+        self.profiler = None  # Profiler_Manager.ProfileController while an owner profiles the next cycle
+        self.progress = None  # Planner_Manager.CycleProgress while a cycle runs (live ETA)
+        self.last_active_codes = None  # (codes, deadlines) of the last successful feed fetch
+        self.last_canary = None  # Report of the canary run by the last fetch_active_codes(validate=True)
+
+    @staticmethod
+    def _valid_weights(weights):
+        # FairShareQueue needs positive weights; a bad entry falls back to the default weight instead of stopping cycles
+        valid = {}
+        for guild_id, weight in weights.items():
+            if isinstance(weight, (int, float)) and weight > 0:
+                valid[guild_id] = weight
+            else:
+                logger.error(f"Ignoring GUILD_WEIGHTS entry {guild_id}: {weight!r} is not a positive number (using 1).")
+        return valid
+
+    @cached_property
+    def api(self):
+        from API_Manager import KingshotAPI  # Pulls in requests
+        return KingshotAPI()
+
+    @cached_property
+    def db(self):
+        from Database_Manager import DatabaseManager
+        db = DatabaseManager()
+        db.load_index()
+        return db
+
+    @cached_property
+    def equivalence(self):
+        from Equivalence_Manager import CodeEquivalence
+        return CodeEquivalence(self.db, self.equivalence_threshold, self.equivalence_probes, self.equivalence_max_age)
+
+    @cached_property
+    def refresher(self):
+        from Refresh_Manager import ProfileRefresher
+        return ProfileRefresher(self)
+
+    @cached_property
+    def profiles(self):
+        from Cache_Manager import ProfileCache
+        return ProfileCache(
+            self.api.fetch_player_info,
+            maxsize=getattr(constants, "PROFILE_CACHE_SIZE", 2048),
+            ttl=getattr(constants, "PROFILE_CACHE_TTL", 300),
+            negative_ttl=getattr(constants, "PROFILE_CACHE_NEGATIVE_TTL", 60),
+        )
+
+    @cached_property
+    def planner(self):
+        from Planner_Manager import CyclePlanner
+        return CyclePlanner(self)
+
+    @cached_property
+    def archiver(self):
+        from Archive_Manager import RedemptionArchiver
+        return RedemptionArchiver(self)
+
+    def fetch_active_codes(self, validate=False):
+        # Active codes ordered by deadline + {code: expires_at}; feed metadata is persisted in gift_codes.
+        # Codes a canary proved invalid are dropped; validate=True runs the canary for codes never checked yet.
+        records = self.api.get_active_code_records()
+        self.db.save_gift_codes(records)
+        codes = [record['code'] for record in records]
+        statuses = self.db.get_code_statuses(codes)
+        if validate:
+            self.last_canary = None
+            unchecked = [code for code in codes if statuses[code] is None]
+            if unchecked:
+                results, self.last_canary = self._canary(unchecked, codes)
+                statuses.update(results)
+        invalid = [code for code in codes if statuses[code] == "invalid"]
+        if invalid:
+            logger.info(f"Ignoring codes that failed validation: {', '.join(invalid)}")
+            codes = [code for code in codes if code not in invalid]
+        deadlines = self.db.get_code_deadlines(codes)
+        ordered = Code_Manager.deadline_order(codes, deadlines)
+        if ordered:
+            self.last_active_codes = (ordered, deadlines)
+        return ordered, deadlines
+
+    def _canary(self, codes, active_codes):
+        # One login of a single player, then one redeem per never-checked code, before they fan out to everyone.
+        # Returns ({code: "valid" | "invalid"}, report); codes missing from the dict were inconclusive.
+        # report ({fid, requests, redeemed, claimed, outcome}) lets the cycle count these requests and tier outcomes.
+        fid = getattr(constants, "CANARY_FID", None) or self.db.get_canary_player(codes)
+        if fid is None:
+            return {}, None
+        logger.info(f"Validating {len(codes)} new code(s) with canary player {fid}: {', '.join(codes)}")
+        report = {"fid": fid, "requests": 1, "redeemed": 0, "claimed": False, "outcome": "login_failed"}
+        if not self._login(fid):
+            return {}, report
+
+        statuses = {}
+        record = self.db.index.get(fid)
+        had_error = False
+        for code in codes:
+            time.sleep(self.request_delay)
+            result = self.api.redeem_code(fid, code)
+            report["requests"] += 1
+            status_code = result.get('code')
+            err_code = result.get('err_code')
+            if status_code == 0 or err_code in [20000, 40008, 40011]:
+                if status_code == 0 or err_code == 20000:
+                    report["redeemed"] += 1
+                    if record:
+                        self.equivalence.observe_success(record, code)
+                self.db.log_successful_redemption(fid, code, result)
+                if err_code == 40011 and record:
+                    self.equivalence.observe_40011(record, code, active_codes)
+                report["claimed"] = True
+                statuses[code] = "valid"
+            elif err_code in [40005, 40007, 40014]:
+                statuses[code] = "invalid"
+            elif err_code in [40006, 40017]:
+                logger.info(f"Canary {fid} doesn't meet the requirements of {code}, letting the cycle decide.")
+                continue
+            else:
+                # Session or network trouble: the remaining codes stay unchecked until the next cycle
+                logger.info(f"Canary for {code} was inconclusive (Err: {err_code}), letting the cycle decide.")
+                had_error = True
+                break
+            self.db.set_code_status(code, statuses[code])
+            logger.info(f"Code {code} is {statuses[code].upper()} (canary {fid}).")
+        report["outcome"] = "success" if report["claimed"] else ("error" if had_error else "idle")
+        return statuses, report
+
+    def plan_cycle(self, kingdoms=None, shard=None, refresh_codes=True):
+        # Dry run: pending pairs, logins, requests and duration of the next cycle
+        with self.api.scheduler.lane("interactive"), self.db.index_gate.shared():
+            return self.planner.plan(kingdoms, shard, refresh_codes)
+
+    def refresh_profiles(self, limit=None):
+        return self.refresher.run_sweep(limit)
+
+    def lookup_player(self, fid):
+        # Interactive profile lookup (/find, /add): served from the profile cache, misses preempt queued cycle requests
+        with self.api.scheduler.lane("interactive"):
+            return self.profiles.get(fid)
+
+    def _login(self, fid):
+        # Redeeming needs a real login, never a cached profile; the answer refreshes the cache
+        player_data, found = self.api.fetch_player_info(fid)
+        if found is not None:
+            self.profiles.put(fid, player_data)
+        return player_data
+
+    def redeem_for_player(self, fid, guild_id=None):
+        with self.api.scheduler.lane("interactive"), self.db.index_gate.shared():
+            return self._redeem_for_player(fid, guild_id)
+
+    def _redeem_for_player(self, fid, guild_id=None):
         logger.info(f"--- Starting redemption for ID: {fid} ---")
         
-        # 1. Fetch all active codes
-        active_codes = self.api.get_active_codes()
+        # 1. Fetch all active codes (earliest expiry first)
+        active_codes, _ = self.fetch_active_codes()
         if not active_codes:
             return {"status": "error", "msg": "No active codes found at the moment."}
         
@@ -62,7 +196,9 @@ class KingshotBot:
         needs_db_save = False
         
         if not player_record:
-            player_data = self.api.get_player_info(fid)
+            if self.profiles.is_known_missing(fid):
+                return {"status": "error", "msg": f"Could not find a player with ID {fid}."}
+            player_data = self._login(fid)
             if not player_data:
                 return {"status": "error", "msg": f"Could not find a player with ID {fid}."}
             nickname = player_data['nickname']
@@ -73,7 +209,7 @@ class KingshotBot:
                 kid = player_record['kid']
             except (IndexError, KeyError):
                 kid = None
-            player_data = self.api.get_player_info(fid)
+            player_data = self._login(fid)
             if not player_data:
                 return {"status": "error", "msg": f"Login failed for {nickname} ({fid})."}
             
@@ -82,16 +218,21 @@ class KingshotBot:
                 nickname = player_data['nickname']
 
         if needs_db_save:
-            self.db._save_player_to_db(player_data)
+            self.db._save_player_to_db(player_data, guild_id)
 
         # 3. Process every active code
         results = []
         redeemed_count = 0
         
+        record = self.db.index.get(fid)
         for code in active_codes:
             if self.db.is_code_redeemed(fid, code):
                 results.append(f"{code}: Already redeemed")
                 continue
+            equivalent = record and self.equivalence.satisfied_by(record, code)
+            if equivalent:
+                results.append(f"{code}: Already redeemed (equivalent of {equivalent})")
+                continue
 
             time.sleep(self.request_delay)
             res = self.api.redeem_code(fid, code)
@@ -101,6 +242,8 @@ class KingshotBot:
             msg = res.get('msg', 'Unknown Error')
 
             if status_code == 0 or err_code in [20000, 40008, 40011]:
+                if record and (status_code == 0 or err_code == 20000):
+                    self.equivalence.observe_success(record, code)
                 self.db.log_successful_redemption(fid, code, res)
                 results.append(f"{code}: Success")
                 redeemed_count += 1
@@ -118,144 +261,318 @@ class KingshotBot:
             "details": results
         }
 
-    def run_redemption_cycle(self):
+    def _plan_kingdom_batches(self, players, kingdoms=None, shard=None):
+        # Groups players by kingdom (kid). Priority kingdoms go first, the rest largest-first.
+        # kingdoms: only process these kids. shard: (index, count) -> only kids where kid % count == index
+        groups = defaultdict(list)
+        for p in players:
+            groups[p.kid].append(p)
+
+        if kingdoms is not None:
+            wanted = set(kingdoms)
+            groups = {kid: batch for kid, batch in groups.items() if kid in wanted}
+        if shard is not None:
+            index, count = shard
+            groups = {kid: batch for kid, batch in groups.items() if kid is not None and kid % count == index}
+
+        priority = {kid: pos for pos, kid in enumerate(self.kingdom_priority)}
+        ordered = sorted(
+            groups.items(),
+            key=lambda item: (priority.get(item[0], len(priority)), -len(item[1]))
+        )
+        return ordered
+
+    def _due_batches(self, players, kingdoms, shard, schedule):
+        # ([(kid, [(player, tier)])], skipped): kingdom batches of the players whose tier is due, hot players first
+        batches = []
+        skipped = 0   # Players not due this cycle (dormant/broken tiers)
+        for kid, batch in self._plan_kingdom_batches(players, kingdoms, shard):
+            due = []
+            for p in batch:
+                row = schedule.get(p.fid)
+                tier = (row['tier'] if row else None) or "normal"
+                if row and not Tier_Manager.is_due(tier, row['days_since_attempt']):
+                    skipped += 1
+                    continue
+                due.append((Tier_Manager.TIER_ORDER.get(tier, 1), p, tier))
+            due.sort(key=lambda item: item[0])  # Hot players first
+            if due:
+                batches.append((kid, [(p, tier) for _, p, tier in due]))
+        return batches, skipped
+
+    def run_redemption_cycle(self, kingdoms=None, shard=None):
+        self.cycle_active.set()
+        self.cycle_idle.clear()
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.cycle_started()
+        try:
+            started = time.time()
+            with self.db.index_gate.shared():  # Maintenance can't swap the index under the cycle's records
+                stats = self._run_redemption_cycle(kingdoms, shard)
+            if stats:
+                stats['duration_s'] = round(time.time() - started, 1)
+                self.db.log_cycle_stats(stats)
+            return stats
+        finally:
+            if profiler is not None:
+                profiler.cycle_finished()
+            self.progress = None
+            self.cycle_active.clear()
+            self.cycle_idle.set()
+
+    def _run_redemption_cycle(self, kingdoms=None, shard=None):
         logger.info("--- Starting Redemption Cycle...")
 
-        # 1. Fetch Active Codes
-        active_codes = self.api.get_active_codes()
+        # 1. Fetch Active Codes (earliest expiry first)
+        active_codes, deadlines = self.fetch_active_codes(validate=True)
+        canary = self.last_canary
         if not active_codes:
             logger.info("No active codes found. Ending cycle.")
             return
 
-        # 2. Fetch Players
-        players = self.db.show_all_players()
+        # 2. Fetch Players (slotted records from the in-memory index)
+        players = self.db.get_indexed_players()
         if not players:
             logger.warning("No players in database. Add players first.")
             return
 
-        # 3. Create Queue
-        queue = deque([(p, 0) for p in players])
+        # 3. Group players into kingdom batches, keeping only players whose tier is due this cycle
+        schedule = self.db.get_player_schedule()
+        batches, stats_skipped_tier = self._due_batches(players, kingdoms, shard, schedule)
         
         # Statistic Trackers 
         stats_redemptions = defaultdict(int) # {fid: count_of_new_codes}
         stats_skipped_full = 0   # Players who needed 0 codes
         stats_skipped_error = 0  # Players dropped due to max retries
+        stats_skipped_kingdom = 0  # (player, code) pairs skipped because the kingdom is not eligible
         failed_players = []      # List of names who failed
 
 
         # Operational Trackers
         consecutive_player_errors = 0
         known_expired_codes = set()
+        kingdom_ineligible = defaultdict(Counter)  # {kid: Counter({code: 40006/40017 responses})}
+        kingdom_eligible = defaultdict(set)        # {kid: {codes someone in the kingdom could claim}}
+        refreshed_profiles = {}  # {fid: (fid, nickname, kid)} from logins, written in bulk at the end
+        outcomes = {}            # {fid: "success" | "idle" | "login_failed" | "error"} for tier updates
+        claimed = set()          # fids that claimed (or had already claimed) a code this cycle
+        equivalence = self.equivalence
+        equivalence.expire()
+        profiles = self.profiles  # Cycle logins keep the /find cache warm
+        if canary is not None:
+            # The canary's login + redeems are part of this cycle: stats, request count and tier outcome
+            stats_redemptions[canary['fid']] += canary['redeemed']
+            outcomes[canary['fid']] = canary['outcome']
+            if canary['claimed']:
+                claimed.add(canary['fid'])
+        satisfied_pairs = set()  # (fid, code) covered by an equivalent code: no API call, and no redemption row either
         
-        total_players_start = len(players)
-
-        logger.info(f"Loaded {total_players_start} players and {len(active_codes)} codes.")
-
-        while queue:
-            player, retries = queue.popleft()
-            fid = player['fid']
-            nickname = player['nickname']
-
-            codes_to_try = []
-
-            for code in active_codes:
-                # CASE A: Skip if we know it's expired for everyone
-                if code in known_expired_codes:
-                    continue
-                # CASE B: Skip if THIS player already has it in DB
-                if self.db.is_code_redeemed(fid, code):
-                    continue
+        total_players_start = sum(len(batch) for _, batch in batches)
+
+        logger.info(f"Loaded {total_players_start} players in {len(batches)} kingdoms and {len(active_codes)} codes.")
+        if stats_skipped_tier:
+            logger.info(f"Skipping {stats_skipped_tier} dormant/broken players not due this cycle.")
+
+        index = self.db.index
+        code_bits = [(code, index.code_bit(code)) for code in active_codes]  # Earliest expiry first
+
+        # Deadline scheduling: codes that expire before this cycle could reach everyone get a first pass
+        # over all players, so the rate budget goes to the pairs that are about to become worthless.
+        passes, urgent, eta = self.planner.split_passes(code_bits, deadlines, batches, equivalence)
+        if urgent:
+            logger.info(f"Urgent pass first for codes expiring before the estimated cycle end ({eta.strftime('%H:%M')} UTC): {', '.join(sorted(urgent))}")
+
+        # Live ETA for /next
+        logins, pairs = count_work(batches, passes, equivalence)
+        progress = self.progress = CycleProgress(logins + pairs, self.planner.seconds_per_request()[0])
+        logger.info(f"Planned {logins} logins + {pairs} redemptions, ETA {progress.eta()['finish_at'].strftime('%H:%M')} UTC.")
+        dropped = set()  # fids dropped after their retry budget, not retried by a later pass
+
+        memberships = self.db.get_guild_memberships()  # {fid: [guild_id]}, first = home guild
+        def home_guild(fid):
+            guilds = memberships.get(fid)
+            return guilds[0] if guilds else None  # Players added before rosters share one flow
+
+        def request_cost(player, bits):
+            # DRR cost: the login plus one request per code still missing in this pass (0 = skipped without requests)
+            pending = sum(1 for _, bit in bits if not player.redeemed & bit)
+            return 1 + pending if pending else 0
+
+        for pass_number, pass_bits in enumerate(passes, 1):
+            final_pass = pass_number == len(passes)
+            if len(passes) > 1:
+                logger.info(f"=== {'Main' if final_pass else 'Urgent'} pass ===")
+            # Fair share: one flow per home guild, kingdom order (priority kingdoms, hot players first) kept inside each flow
+            queue = FairShareQueue(self.guild_weights)
+            for _, batch in batches:
+                for p, tier in batch:
+                    if p.fid not in dropped:
+                        queue.push(home_guild(p.fid), (p, tier, 0), request_cost(p, pass_bits))
+            logger.info(f"Fair-share queue: {len(queue)} players across {len(queue.queues)} guild rosters.")
+
+            while queue:
+                guild, (player, tier, retries) = queue.pop()
+                fid = player.fid
+                kid = player.kid
+                nickname = player.nickname
+                max_attempts = Tier_Manager.policy(tier)["attempts"]
+
+                codes_to_try = []
+                skipped_by_kingdom = 0
+
+                for code, bit in pass_bits:
+                    # CASE A: Skip if we know it's expired for everyone
+                    if code in known_expired_codes:
+                        continue
+                    # CASE B: Skip if THIS player already has it (index mirrors the DB)
+                    if player.redeemed & bit:
+                        continue
+                    # CASE B2: Skip if the player has an equivalent code (learned from 40011, probes excepted)
+                    if equivalence.satisfied_by(player, code):
+                        satisfied_pairs.add((fid, code))
+                        continue
+                    # CASE C: Skip if the kingdom has proven not eligible for this code
+                    if self._is_kingdom_ineligible(kid, code, kingdom_ineligible, kingdom_eligible):
+                        skipped_by_kingdom += 1
+                        continue
                 
-                codes_to_try.append(code)
-
-            # If no codes are needed, SKIP LOGIN entirely.
-            if not codes_to_try:
-                if stats_redemptions[fid] == 0:
-                    stats_skipped_full += 1
-                    logger.info(f"Skipping {nickname}: All codes already redeemed.")
-                continue
+                    codes_to_try.append(code)
+
+                stats_skipped_kingdom += skipped_by_kingdom
+
+                # If no codes are needed, SKIP LOGIN entirely.
+                if not codes_to_try:
+                    if final_pass and stats_redemptions[fid] == 0:
+                        stats_skipped_full += 1
+                        if skipped_by_kingdom:
+                            logger.info(f"Skipping {nickname}: Remaining codes are not available in kingdom {kid}.")
+                        else:
+                            logger.info(f"Skipping {nickname}: All codes already redeemed.")
+                    continue
 
-            # 1. LOGIN (Get Player Info)
-            profile = self.api.get_player_info(fid)
+                # 1. LOGIN (Get Player Info)
+                profile = self.api.get_player_info(fid)
+                progress.tick()
             
-            if not profile:
-                # Login failed (Network or Bad ID)
-                consecutive_player_errors += 1
-
-                if retries < 2: # Max 3 attempts (0, 1, 2)
-                    logger.warning(f"Login failed for {nickname}. Re-queueing (Attempt {retries+1}/3).")
-                    queue.append((player, retries + 1))
-                    self._check_pause(consecutive_player_errors)
-                else:
-                    logger.error(f"Dropping {nickname} after 3 failed login attempts.")
-                    stats_skipped_error += 1
-                    failed_players.append(nickname)
+                if not profile:
+                    # Login failed (Network or Bad ID)
+                    consecutive_player_errors += 1
+
+                    if retries < max_attempts - 1: # Retry budget depends on the tier
+                        logger.warning(f"Login failed for {nickname}. Re-queueing (Attempt {retries+1}/{max_attempts}).")
+                        queue.push(guild, (player, tier, retries + 1), request_cost(player, pass_bits))
+                        self._check_pause(consecutive_player_errors)
+                    else:
+                        logger.error(f"Dropping {nickname} after {max_attempts} failed login attempts.")
+                        stats_skipped_error += 1
+                        dropped.add(fid)
+                        failed_players.append(nickname)
+                        outcomes[fid] = "login_failed"
                 
-                continue
+                    continue
             
-            if profile['nickname'] != player['nickname'] or profile['kid'] != player['kid']:
-                self.db._update_player_info(fid, profile['nickname'], profile['kid'])
+                refreshed_profiles[fid] = (fid, profile['nickname'], profile['kid'])
+                profiles.put(fid, profile)
 
-            # Sleep after login
-            time.sleep(self.request_delay)
+                # Sleep after login
+                time.sleep(self.request_delay)
 
-            # 2. REDEEM CODES
-            player_had_error = False
+                # 2. REDEEM CODES
+                player_had_error = False
             
-            for code in codes_to_try:
-
-                # Call API
-                result = self.api.redeem_code(fid, code)
-                err_code = result.get('err_code')
-                status_code = result.get('code')
+                for code in codes_to_try:
+                    # Another player of this kingdom may have proven it ineligible meanwhile
+                    if self._is_kingdom_ineligible(kid, code, kingdom_ineligible, kingdom_eligible):
+                        stats_skipped_kingdom += 1
+                        continue
+                    # An equivalent code may have been claimed earlier in this loop
+                    if equivalence.satisfied_by(player, code):
+                        satisfied_pairs.add((fid, code))
+                        continue
+
+                    # Call API
+                    result = self.api.redeem_code(fid, code)
+                    progress.tick()
+                    err_code = result.get('err_code')
+                    status_code = result.get('code')
                 
-                # CASE A: SUCCESS / ALREADY CLAIMED / MUTUALLY EXCLUSIVE
-                if status_code == 0 or err_code in [20000, 40008, 40011]:
-                    if status_code == 0 or err_code == 20000:
-                        stats_redemptions[fid] += 1
+                    # CASE A: SUCCESS / ALREADY CLAIMED / MUTUALLY EXCLUSIVE
+                    if status_code == 0 or err_code in [20000, 40008, 40011]:
+                        if status_code == 0 or err_code == 20000:
+                            stats_redemptions[fid] += 1
+                            equivalence.observe_success(player, code)
                     
-                    self.db.log_successful_redemption(fid, code, result)
-                    consecutive_player_errors = 0 
+                        self.db.log_successful_redemption(fid, code, result)
+                        kingdom_eligible[kid].add(code)
+                        claimed.add(fid)
+                        if err_code == 40011:
+                            equivalence.observe_40011(player, code, active_codes)
+                        consecutive_player_errors = 0 
                 
-                # CASE B : EXPIRED (Global) or Claim limit reached
-                elif err_code in [40007, 40005]:
-                    logger.warning(f"Code {code} is EXPIRED. Skipping for everyone.")
-                    known_expired_codes.add(code)
-
-                # CASE C : Player doesn't meet requirements (Level, etc)
-                elif err_code in [40006, 40017]:
-                    logger.info(f"Player {nickname} does not meet requirements for Code {code}. Skipping.")
+                    # CASE B : EXPIRED (Global) or Claim limit reached
+                    elif err_code in [40007, 40005]:
+                        logger.warning(f"Code {code} is EXPIRED. Skipping for everyone.")
+                        known_expired_codes.add(code)
+
+                    # CASE C : Player doesn't meet requirements (Level, Kingdom, etc)
+                    elif err_code in [40006, 40017]:
+                        logger.info(f"Player {nickname} does not meet requirements for Code {code}. Skipping.")
+                        if kid is not None:
+                            kingdom_ineligible[kid][code] += 1
+                            if self._is_kingdom_ineligible(kid, code, kingdom_ineligible, kingdom_eligible):
+                                logger.warning(f"Code {code} looks unavailable in kingdom {kid}. Skipping for the rest of the kingdom.")
                 
-                # CASE C: ERROR (Network, Unknown, Not Login)
-                else:
-                    msg = result.get('msg', 'Unknown')
-                    logger.warning(f"Failed {nickname} on {code}: {msg} (Err: {err_code})")
-                    player_had_error = True
-                    break
+                    # CASE D: ERROR (Network, Unknown, Not Login)
+                    else:
+                        msg = result.get('msg', 'Unknown')
+                        logger.warning(f"Failed {nickname} on {code}: {msg} (Err: {err_code})")
+                        player_had_error = True
+                        break
                 
-                time.sleep(self.request_delay)
-
-            # 3. QUEUE MANAGEMENT
-            if player_had_error:
-                consecutive_player_errors += 1
-                if retries < 2:
-                    logger.info(f"Re-queueing {nickname} due to error.")
-                    queue.append((player, retries + 1))
-                    self._check_pause(consecutive_player_errors)
+                    time.sleep(self.request_delay)
+
+                # 3. QUEUE MANAGEMENT
+                if player_had_error:
+                    consecutive_player_errors += 1
+                    if retries < max_attempts - 1:
+                        logger.info(f"Re-queueing {nickname} due to error.")
+                        queue.push(guild, (player, tier, retries + 1), request_cost(player, pass_bits))
+                        self._check_pause(consecutive_player_errors)
+                    else:
+                        logger.error(f"Dropping {nickname} after {max_attempts} failed attempts.")
+                        stats_skipped_error += 1
+                        dropped.add(fid)
+                        failed_players.append(nickname)
+                        outcomes[fid] = "success" if fid in claimed else "error"
                 else:
-                    logger.error(f"Dropping {nickname} after 3 failed attempts.")
-                    stats_skipped_error += 1
-                    failed_players.append(nickname)
-            else:
-                pass
+                    outcomes[fid] = "success" if fid in claimed else "idle"
+
+        self.db.bulk_update_player_info(list(refreshed_profiles.values()))
+        tier_changes = self._update_tiers(schedule, outcomes, claimed)
 
     # 4. FINAL STATS
         logger.info("--- Redemption Cycle Completed ---")
         logger.info(f"Players processed: total - {total_players_start}, skipped (Already Had All): {stats_skipped_full}, skipped (Errors/Dropped):  {stats_skipped_error}")
+        if stats_skipped_kingdom:
+            logger.info(f"   -> Requests saved by kingdom eligibility: {stats_skipped_kingdom}")
+        if satisfied_pairs:
+            logger.info(f"   -> Requests saved by equivalent codes: {len(satisfied_pairs)}")
         
         if failed_players:
             logger.info(f"   -> Failed Players: {', '.join(failed_players)}")
 
+        # Per-guild view of the cycle for the guild-scoped reports (a player counts for every guild that added them)
+        guild_stats = defaultdict(lambda: {"players": 0, "redeemed": 0, "failed": []})
+        for _, batch in batches:
+            for p, _ in batch:
+                for guild_id in memberships.get(p.fid, ()):
+                    entry = guild_stats[guild_id]
+                    entry["players"] += 1
+                    entry["redeemed"] += stats_redemptions.get(p.fid, 0)
+                    if p.fid in dropped:
+                        entry["failed"].append(p.nickname)
+
         redeem_counts = [v for k,v in stats_redemptions.items() if v > 0]
         distribution = Counter(redeem_counts) if redeem_counts else {}
         
@@ -273,10 +590,39 @@ class KingshotBot:
             "total_players": total_players_start,
             "skipped_full": stats_skipped_full,
             "skipped_error": stats_skipped_error,
+            "skipped_kingdom": stats_skipped_kingdom,
+            "skipped_tier": stats_skipped_tier,
+            "skipped_equivalent": len(satisfied_pairs),
+            "tier_changes": tier_changes,
+            "requests": progress.done + (canary['requests'] if canary else 0),
             "failed_players": failed_players,
-            "distribution": distribution
+            "distribution": distribution,
+            "guilds": dict(guild_stats)
         }
 
+    def _update_tiers(self, schedule, outcomes, claimed):
+        # Promote/demote every player that spent requests this cycle, one bulk write
+        updates = []
+        changes = Counter()  # {"normal->dormant": n}
+        for fid, outcome in outcomes.items():
+            row = schedule.get(fid)
+            tier = (row['tier'] if row else None) or "normal"
+            fail_streak = (row['fail_streak'] if row else 0) or 0
+            idle_streak = (row['idle_streak'] if row else 0) or 0
+            new_tier, fail_streak, idle_streak = Tier_Manager.next_state(tier, fail_streak, idle_streak, outcome)
+            if new_tier != tier:
+                changes[f"{tier}->{new_tier}"] += 1
+            updates.append((fid, new_tier, fail_streak, idle_streak, fid in claimed))
+        self.db.bulk_update_player_tiers(updates)
+        for change, count in sorted(changes.items()):
+            logger.info(f"   Tier change {change}: {count} player(s)")
+        return dict(changes)
+
+    def _is_kingdom_ineligible(self, kid, code, kingdom_ineligible, kingdom_eligible):
+        if kid is None or code in kingdom_eligible[kid]:
+            return False
+        return kingdom_ineligible[kid][code] >= self.kingdom_ineligible_threshold
+
     def _check_pause(self, error_count):
         if error_count >= self.error_threshold:
             logger.warning(f"SERIOUS ERROR: {error_count} Players failed in a row. Pausing for {self.pause_duration}s...")
@@ -314,6 +660,42 @@ class KingshotBot:
                 time.sleep(60)
  
 
+    def export_data(self, path, fmt="jsonl", since=None):
+        from Export_Manager import Exporter
+        return Exporter(self.db).export(path, fmt, since)
+
+    def run_maintenance(self, active_codes=None):
+        # Archive expired codes, refresh planner stats, vacuum freed pages
+        return self.archiver.run(active_codes)
+
+
 # For testing: 
 if __name__ == "__main__":
-    bot = KingshotBot()
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Kingshot Auto-Redeemer")
+    subparsers = parser.add_subparsers(dest="command")
+    export_parser = subparsers.add_parser("export", help="Stream players, redemptions and cycle stats to a zip archive")
+    export_parser.add_argument("path", help="Output .zip file")
+    export_parser.add_argument("--format", choices=["jsonl", "csv", "parquet"], default="jsonl")
+    export_parser.add_argument("--since", help="Only rows added/changed since this UTC timestamp (YYYY-MM-DD[ HH:MM:SS])")
+    subparsers.add_parser("plan", help="Dry run of the next redemption cycle (pending pairs, requests, ETA)")
+    subparsers.add_parser("maintenance", help="Archive expired codes, ANALYZE and incrementally vacuum the database")
+    args = parser.parse_args()
+
+    setup_logging()
+    bot = KingshotBot()
+
+    if args.command == "export":
+        try:
+            bot.export_data(args.path, args.format, args.since)
+        except ValueError as e:
+            parser.error(str(e))
+    elif args.command == "maintenance":
+        bot.run_maintenance()
+    elif args.command == "plan":
+        plan = bot.plan_cycle()
+        print(f"Codes: {', '.join(plan['codes']) or 'none'}" + (f" (urgent: {', '.join(plan['urgent'])})" if plan['urgent'] else ""))
+        print(f"Players due: {plan['players_due']} in {plan['kingdoms']} kingdoms ({plan['players_skipped_tier']} not due)")
+        print(f"Requests: {plan['requests']} ({plan['logins']} logins + {plan['pairs']} redemptions)")
+        print(f"Estimate: {timedelta(seconds=round(plan['duration_s']))} at {plan['seconds_per_request']:.1f}s/request ({plan['pace_source']})")
@@ -0,0 +1,28 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Scheduler_Manager import FairShareQueue
+
+class FairShareQueueTest(unittest.TestCase):
+    def test_rejects_non_positive_weights(self):
+        for weight in (0, -1):
+            with self.assertRaises(ValueError):
+                FairShareQueue({"a": weight})
+
+    def test_weighted_share(self):
+        queue = FairShareQueue({"a": 2}, quantum=1)
+        for i in range(4):
+            queue.push("a", f"a{i}")
+            queue.push("b", f"b{i}")
+        order = [queue.pop()[0] for _ in range(6)]
+        self.assertEqual(order, ["a", "a", "b", "a", "a", "b"])
+
+    def test_pop_empty(self):
+        with self.assertRaises(IndexError):
+            FairShareQueue().pop()
+
+if __name__ == "__main__":
+    unittest.main()